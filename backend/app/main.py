@@ -1,9 +1,77 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import profiles, auth
-from .utils.database import database, profiles_collection
+from .routes import profiles, auth, photos
+from .utils.database import (
+    database, profiles_collection, profiles_read_collection, matches_collection, email_outbox_collection,
+    close_client, pool_metrics
+)
+from .utils.migrations import provision, RUN_MIGRATIONS_ON_STARTUP
+from .utils.leaderboard import leaderboard_cache
+from .utils.leaderboard_stream import leaderboard_stream
+from .utils.vote_queue import vote_queue, VOTE_WRITE_BEHIND
+from .utils.photos import shutdown_executor
+from .utils.hashing import hashing_pool
+from .utils.principals import principal_cache
+from .utils.serialization import ORJSONResponse
+from .utils.http_cache import profile_response_cache
+from .utils.compression import install_compression
+from .utils.email import email_outbox, smtp_connection, EMAIL_DELIVERY
+from .utils.metrics import registry, install_metrics, event_loop_monitor, METRICS_ENABLED, CONTENT_TYPE
+
+LEADERBOARD_RESYNC_SECONDS = float(os.environ.get("LEADERBOARD_RESYNC_SECONDS", "15"))
+
+@asynccontextmanager
+async def lifespan(app):
+    """Provision the database and warm in-process state, then tear it all down on shutdown"""
+    background_tasks = []
+    
+    if RUN_MIGRATIONS_ON_STARTUP:
+        try:
+            await provision(database)
+        except Exception as e:
+            print(f"Could not provision database: {e}")
+    
+    try:
+        await leaderboard_cache.rebuild(profiles_read_collection)
+    except Exception as e:
+        print(f"Could not warm leaderboard cache: {e}")
+    
+    if VOTE_WRITE_BEHIND:
+        await vote_queue.start(profiles_collection, matches_collection)
+    
+    if EMAIL_DELIVERY:
+        email_outbox.start(email_outbox_collection, smtp_connection(), os.environ.get("EMAIL_USER"))
+    
+    background_tasks.append(asyncio.create_task(
+        leaderboard_cache.resync_forever(profiles_read_collection, LEADERBOARD_RESYNC_SECONDS)
+    ))
+    leaderboard_stream.start()
+    if METRICS_ENABLED:
+        background_tasks.append(asyncio.create_task(event_loop_monitor.run_forever()))
+    
+    try:
+        yield
+    finally:
+        # Flush queued votes before anything they depend on goes away
+        await vote_queue.drain()
+        await email_outbox.stop()
+        leaderboard_stream.stop()
+        
+        for task in background_tasks:
+            task.cancel()
+        
+        shutdown_executor()
+        hashing_pool.shutdown()
+        close_client()
 
-app = FastAPI(title="Northeastern CS Ranked API")
+app = FastAPI(
+    title="Northeastern CS Ranked API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # Configure CORS
 app.add_middleware(
@@ -12,16 +80,61 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Compress larger responses; added after CORS so it wraps everything
+install_compression(app)
+
+# Time requests; added last so the timing covers every other middleware
+install_metrics(app)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(profiles.router, prefix="/api/profiles", tags=["profiles"])
+app.include_router(photos.router, prefix="/api/photos", tags=["photos"])
 
 @app.get("/")
 async def root():
     return {"message": "Northeastern CS Ranked API"}
 
+@app.get("/api/stats")
+async def get_stats():
+    """Report the state of in-process caches"""
+    return {
+        "leaderboard_cache": leaderboard_cache.stats(),
+        "vote_queue": vote_queue.stats(),
+        "hashing_pool": hashing_pool.stats(),
+        "principal_cache": principal_cache.stats(),
+        "mongodb_pool": pool_metrics.stats(),
+        "profile_response_cache": profile_response_cache.stats(),
+        "email_outbox": email_outbox.stats(),
+        "leaderboard_stream": leaderboard_stream.stats(),
+    }
+
+# In-process state exposed as metrics, read only when /metrics is scraped
+registry.callback_gauge("bcrypt_pool_in_flight", "Password hashes running or waiting for a worker",
+                        lambda: hashing_pool.in_flight)
+registry.callback_gauge("bcrypt_pool_queue_depth", "Password hashes waiting for a worker",
+                        lambda: max(hashing_pool.in_flight - hashing_pool.workers, 0))
+registry.callback_counter("bcrypt_pool_rejected_total", "Password hashes turned away by a full pool",
+                          lambda: hashing_pool.rejected)
+registry.callback_gauge("mongodb_pool_connections_in_use", "MongoDB connections checked out",
+                        lambda: pool_metrics.checkouts - pool_metrics.checkins)
+registry.callback_counter("mongodb_pool_checkout_failures_total", "MongoDB connection check-outs that failed",
+                          lambda: pool_metrics.checkout_failures)
+registry.callback_gauge("vote_queue_depth", "Votes waiting to be written", lambda: len(vote_queue))
+registry.callback_gauge("leaderboard_cache_age_seconds", "Seconds since the leaderboard cache was rebuilt",
+                        lambda: leaderboard_cache.stats()["age_seconds"])
+registry.callback_gauge("leaderboard_stream_subscribers", "Open leaderboard streams", lambda: len(leaderboard_stream))
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    if not METRICS_ENABLED:
+        return Response(status_code=404)
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/api/db-test")
 async def test_database():
     """Test database connection"""
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class Experience(BaseModel):
     title: str = ""
@@ -29,12 +29,71 @@ class Profile(BaseModel):
     name: str
     email: str
     photo_url: str = "https://randomuser.me/api/portraits/lego/1.jpg"
+    photo_variants: Optional[Dict[str, str]] = None
     experiences: List[Experience] = Field(default_factory=list)
     clubs: List[Club] = Field(default_factory=list)
     education: Education = Field(default_factory=Education)
     elo_rating: int = 1500
     match_count: int = 0
+    rating_deviation: Optional[float] = None
+    rating_volatility: Optional[float] = None
     linkedin_url: Optional[str] = None
     github_url: Optional[str] = None
     user_id: Optional[str] = None
     is_northeastern_verified: bool = False
+
+class LeaderboardEntry(BaseModel):
+    name: str
+    photo_url: str = "https://randomuser.me/api/portraits/lego/1.jpg"
+    photo_variants: Optional[Dict[str, str]] = None
+    clubs: List[Club] = Field(default_factory=list)
+    education: Education = Field(default_factory=Education)
+    elo_rating: int = 1500
+    match_count: int = 0
+
+# MongoDB projection covering every field a Profile response needs
+PROFILE_PROJECTION = {
+    "name": 1,
+    "email": 1,
+    "photo_url": 1,
+    "photo_variants": 1,
+    "experiences": 1,
+    "clubs": 1,
+    "education": 1,
+    "elo_rating": 1,
+    "match_count": 1,
+    "rating_deviation": 1,
+    "rating_volatility": 1,
+    "linkedin_url": 1,
+    "github_url": 1,
+    "user_id": 1,
+    "is_northeastern_verified": 1,
+}
+
+# Profile fields plus the version counter that drives ETags
+VERSIONED_PROFILE_PROJECTION = {**PROFILE_PROJECTION, "version": 1}
+
+# MongoDB projection covering only what the leaderboard renders
+LEADERBOARD_PROJECTION = {
+    "name": 1,
+    "photo_url": 1,
+    "photo_variants": 1,
+    "clubs": 1,
+    "education": 1,
+    "elo_rating": 1,
+    "match_count": 1,
+}
+
+# Values used for fields a stored profile is missing or has set to null.
+# Callables produce a fresh mutable value per document.
+DEFAULT_PHOTO_URL = "https://randomuser.me/api/portraits/lego/1.jpg"
+EDUCATION_DEFAULTS = {"degree": "", "major": "", "graduation_year": 2025}
+PROFILE_DEFAULTS = {
+    "photo_url": DEFAULT_PHOTO_URL,
+    "experiences": list,
+    "clubs": list,
+    "education": lambda: dict(EDUCATION_DEFAULTS),
+    "elo_rating": 1500,
+    "match_count": 0,
+    "is_northeastern_verified": False,
+}
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import re
+from ..utils.photos import open_photo
+from ..utils.http_cache import etag_matches, not_modified
+
+router = APIRouter()
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Photos are content-addressed, so a URL always refers to the same bytes
+PHOTO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{digest}")
+async def get_photo(digest: str, request: Request):
+    """Stream a stored profile photo"""
+    if not DIGEST_PATTERN.match(digest):
+        raise HTTPException(status_code=404, detail="Photo not found")
+
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": PHOTO_CACHE_CONTROL}
+
+    if etag_matches(request, etag):
+        return not_modified(etag, PHOTO_CACHE_CONTROL)
+
+    grid_out = await open_photo(digest)
+    if grid_out is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+
+    async def chunks():
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    headers["Content-Length"] = str(grid_out.length)
+    content_type = (grid_out.metadata or {}).get("content_type", "application/octet-stream")
+    return StreamingResponse(chunks(), media_type=content_type, headers=headers)
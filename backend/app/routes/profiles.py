@@ -1,12 +1,35 @@
-from fastapi import APIRouter, HTTPException, Body, Depends
-from ..models.profile import Profile, ProfileCreate
-from ..utils.database import profiles_collection
-from ..utils.elo import calculate_elo
-from ..utils.auth import get_current_user, generate_verification_code
-from typing import List
-import random
+from fastapi import APIRouter, HTTPException, Body, Depends, Query, BackgroundTasks, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from ..models.profile import (
+    Profile, ProfileCreate, PROFILE_PROJECTION, VERSIONED_PROFILE_PROJECTION, LEADERBOARD_PROJECTION,
+    PROFILE_DEFAULTS
+)
+from ..utils.database import profiles_collection, profiles_read_collection, matches_collection, email_outbox_collection
+from ..utils.matchmaking import sample_profile_pair
+from ..utils.votes import load_ratings, apply_vote, RatingConflict, RATING_PROJECTION
+from ..utils.matchups import (
+    issue_matchup_token, read_matchup_token, apply_matchup_votes, MAX_MATCHUPS, MAX_VOTE_BATCH, VALID_RESULTS
+)
+from ..utils.vote_queue import vote_queue
+from ..utils.photos import decode_data_url, store_photo, photo_path, attach_variants, MAX_PHOTO_BYTES
+from ..utils.auth import get_current_user, generate_verification_code, create_access_token, token_claims
+from ..utils.email import send_verification_email, EmailRateLimited, EMAIL_DELIVERY
+from ..utils.search import search_filter, search_terms
+from ..utils.pagination import encode_cursor, decode_cursor, keyset_filter, RANKING_SORT
+from ..utils.leaderboard import leaderboard_cache, parse_segment, segment_filter
+from ..utils.leaderboard_stream import leaderboard_stream
+from ..utils.principals import principal_cache
+from ..utils.serialization import (
+    ORJSONResponse, profile_response, merge_defaults, leaderboard_entry, parse_fields, select_fields
+)
+from ..utils.http_cache import (
+    etag_matches, not_modified, body_etag, profile_etag, profile_response_cache,
+    PROFILE_CACHE_CONTROL, LEADERBOARD_CACHE_CONTROL
+)
+from typing import List, Optional
 from pydantic import BaseModel
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
 from urllib.parse import urlparse
 import re
@@ -59,27 +82,135 @@ class VoteRequest(BaseModel):
     opponent_id: str
     result: float  # 1 for win, 0 for loss, 0.5 for draw
 
+class MatchupVote(BaseModel):
+    token: str
+    result: float  # 1 if the first profile of the matchup won, 0 if it lost, 0.5 for draw
+
+class VoteBatch(BaseModel):
+    votes: List[MatchupVote]
+
 class VerificationRequest(BaseModel):
     verification_code: str
 
+def profile_fields(fields):
+    """Projection for a profile `fields=` parameter, or None for full profiles"""
+    try:
+        return parse_fields(fields, PROFILE_PROJECTION)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def profile_list_response(profiles, projection):
+    """Full profiles go through the response model; sparse ones are rendered as-is"""
+    if projection is None:
+        return [profile_response(profile) for profile in profiles]
+    return ORJSONResponse([merge_defaults(profile, projection, PROFILE_DEFAULTS) for profile in profiles])
+
 router = APIRouter()
 
 @router.get("/random", response_model=List[Profile])
-async def get_random_profiles():
-    """Fetch two random profiles for comparison"""
+async def get_random_profiles(fields: Optional[str] = None):
+    """Fetch two random profiles for comparison
+    
+    `fields` is an optional comma separated sparse fieldset; only those
+    fields (plus _id) are read from MongoDB and returned.
+    """
     try:
-        all_profiles = await profiles_collection.find().to_list(length=None)
+        projection = profile_fields(fields)
+        selected_profiles = await sample_profile_pair(profiles_read_collection, projection or PROFILE_PROJECTION)
         
-        if len(all_profiles) < 2:
+        if len(selected_profiles) < 2:
+            raise HTTPException(status_code=404, detail="Not enough profiles in the database")
+        
+        return profile_list_response(selected_profiles, projection)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/matchups")
+async def get_matchups(n: int = Query(10, ge=1), fields: Optional[str] = None):
+    """Fetch up to `n` matchups at once, each with a signed token to vote with
+    
+    Pairs come from one random sample. Each token carries the pair and both
+    rating snapshots, so POST /votes can apply the result without reading
+    the profiles again.
+    Accepts the same `fields` sparse fieldset as /random.
+    """
+    try:
+        projection = profile_fields(fields)
+        n = min(n, MAX_MATCHUPS)
+        
+        # Serve the profiles and the rating fields the tokens snapshot in one query
+        read_projection = {**(projection or PROFILE_PROJECTION), **RATING_PROJECTION}
+        sample = await profiles_read_collection.aggregate([
+            {"$sample": {"size": 2 * n}},
+            {"$project": read_projection},
+        ]).to_list(length=2 * n)
+        pairs = [
+            (a, b) for a, b in zip(sample[0::2], sample[1::2]) if a["_id"] != b["_id"]
+        ]
+        
+        if not pairs:
             raise HTTPException(status_code=404, detail="Not enough profiles in the database")
-            
-        selected_profiles = random.sample(all_profiles, 2)
         
-        # Convert ObjectId to string for each profile
-        for profile in selected_profiles:
-            profile["_id"] = str(profile["_id"])
+        def render(profile):
+            if projection is None:
+                return profile_response(profile)
+            return merge_defaults(profile, projection, PROFILE_DEFAULTS)
         
-        return [Profile(**profile) for profile in selected_profiles]
+        return ORJSONResponse([
+            {"token": issue_matchup_token(a, b), "profiles": [render(a), render(b)]}
+            for a, b in pairs
+        ])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/votes")
+async def submit_votes(batch: VoteBatch):
+    """Record results for many matchups from /matchups in one request
+    
+    Every vote needs a token issued by /matchups; the result is from the
+    point of view of the token's first profile. Votes are rated in the
+    order sent, each building on the ratings the previous ones produced;
+    with ELO they are applied with one insert and one bulk write. Invalid
+    or expired tokens are reported by position without failing the rest,
+    and a token that was already voted on counts as a duplicate.
+    """
+    try:
+        if len(batch.votes) > MAX_VOTE_BATCH:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_VOTE_BATCH} votes per request")
+        
+        votes = []
+        positions = []  # index in the request of each entry of votes
+        rejected = []
+        for index, vote in enumerate(batch.votes):
+            if vote.result not in VALID_RESULTS:
+                rejected.append({"index": index, "detail": "Result must be 0, 0.5 or 1"})
+                continue
+            try:
+                votes.append((read_matchup_token(vote.token), vote.result))
+                positions.append(index)
+            except ValueError as e:
+                rejected.append({"index": index, "detail": str(e)})
+        
+        applied, duplicates, conflicts = await apply_matchup_votes(profiles_collection, matches_collection, votes)
+        for index in conflicts:
+            rejected.append({"index": positions[index], "detail": "Profile is being updated too often, try again"})
+        rejected.sort(key=lambda entry: entry["index"])
+        
+        for profile_id, (rating_delta, matches) in applied.items():
+            leaderboard_cache.shift_rating(profile_id, rating_delta, matches)
+        profile_response_cache.invalidate(*applied)
+        
+        return {
+            "applied": len(votes) - duplicates - len(conflicts),
+            "duplicates": duplicates,
+            "rejected": rejected,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -93,48 +224,56 @@ async def vote_profile(profile_id: str, vote_request: VoteRequest):
         except:
             raise HTTPException(status_code=400, detail="Invalid profile ID format")
 
-        profile = await profiles_collection.find_one({"_id": profile_oid})
-        opponent = await profiles_collection.find_one({"_id": opponent_oid})
+        if profile_oid == opponent_oid:
+            raise HTTPException(status_code=400, detail="A profile cannot be voted against itself")
+        
+        # Write-behind mode: spool the vote and let the background flusher apply it
+        if vote_queue.running:
+            if not vote_queue.submit(profile_id, vote_request.opponent_id, vote_request.result):
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many pending votes, try again shortly",
+                    headers={"Retry-After": "1"}
+                )
+            return JSONResponse(status_code=202, content={"message": "Vote accepted", "queued": True})
+
+        profiles = await load_ratings(profiles_collection, [profile_oid, opponent_oid])
+        profile = profiles.get(profile_oid)
+        opponent = profiles.get(opponent_oid)
         
         if not profile:
             raise HTTPException(status_code=404, detail=f"Profile with ID {profile_id} not found")
         if not opponent:
             raise HTTPException(status_code=404, detail=f"Opponent profile with ID {vote_request.opponent_id} not found")
-            
-        # Calculate new ELO ratings
-        new_profile_rating = await calculate_elo(
-            profile["elo_rating"],
-            opponent["elo_rating"],
-            vote_request.result
-        )
         
-        new_opponent_rating = await calculate_elo(
-            opponent["elo_rating"],
-            profile["elo_rating"],
-            1 - vote_request.result
-        )
+        # Rate with the configured engine and write both profiles and the match log
+        try:
+            (profile_state, new_profile_state), (opponent_state, new_opponent_state) = await apply_vote(
+                profiles_collection, profile, opponent, vote_request.result, matches_collection
+            )
+        except RatingConflict as e:
+            raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "1"})
         
-        await profiles_collection.update_one(
-            {"_id": profile_oid},
-            {
-                "$set": {"elo_rating": new_profile_rating},
-                "$inc": {"match_count": 1}
-            }
-        )
+        new_profile_rating = new_profile_state["elo_rating"]
+        new_opponent_rating = new_opponent_state["elo_rating"]
+        profile_delta = new_profile_rating - profile_state["elo_rating"]
+        opponent_delta = new_opponent_rating - opponent_state["elo_rating"]
         
-        await profiles_collection.update_one(
-            {"_id": opponent_oid},
-            {
-                "$set": {"elo_rating": new_opponent_rating},
-                "$inc": {"match_count": 1}
-            }
-        )
+        # Shift by the same deltas the database applied; absolute values computed
+        # from the read above would let a concurrent vote's stale value win
+        leaderboard_cache.shift_rating(profile_id, profile_delta)
+        leaderboard_cache.shift_rating(vote_request.opponent_id, opponent_delta)
+        profile_response_cache.invalidate(profile_id, vote_request.opponent_id)
         
         return {
             "message": "Vote recorded successfully",
             "new_ratings": {
                 "profile": new_profile_rating,
                 "opponent": new_opponent_rating
+            },
+            "rating_changes": {
+                "profile": profile_delta,
+                "opponent": opponent_delta
             }
         }
     except HTTPException:
@@ -143,27 +282,200 @@ async def vote_profile(profile_id: str, vote_request: VoteRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/leaderboard")
-async def get_leaderboard():
-    """Fetch top-ranked profiles"""
+async def get_leaderboard(
+    request: Request,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    club: Optional[str] = None,
+    major: Optional[str] = None,
+    year: Optional[int] = None
+):
+    """Fetch a page of top-ranked profiles
+    
+    Pages are ordered by (elo_rating, _id) descending. When more rows may
+    follow, the cursor for the next page is returned in the X-Next-Cursor
+    header. Served from the in-memory leaderboard cache while it is fresh,
+    with an ETag tied to the cache generation so unchanged pages get a 304.
+    `fields` selects a sparse fieldset; _id and elo_rating are always
+    included since the cursor is built from them. One of `club`, `major`
+    or `year` ranks only that segment's members.
+    """
     try:
-        profiles = await profiles_collection.find().sort("elo_rating", -1).to_list(length=None)
+        try:
+            projection = parse_fields(fields, LEADERBOARD_PROJECTION, always=("elo_rating",))
+            segment = parse_segment(club, major, year)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Convert ObjectId to string for each profile
-        result = []
-        for profile in profiles:
-            # Convert ObjectId to string
-            profile_id = str(profile["_id"])
-            
-            # Create a Profile object
-            profile_obj = Profile(**profile)
-            
-            # Convert to dict and add the _id field explicitly
-            profile_dict = profile_obj.dict()
-            profile_dict["_id"] = profile_id
+        query = segment_filter(segment)
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+                query.update(keyset_filter(cursor))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        etag = leaderboard_cache.etag()
+        if etag is not None and etag_matches(request, etag):
+            return not_modified(etag, LEADERBOARD_CACHE_CONTROL)
+        
+        result = leaderboard_cache.page(limit, after, segment)
+        
+        if result is not None:
+            if projection is not None:
+                result = [select_fields(entry, projection) for entry in result]
+        elif projection is not None:
+            etag = None
+            profiles = await profiles_read_collection.find(query, projection) \
+                .sort(RANKING_SORT).limit(limit).to_list(length=limit)
+            result = [merge_defaults(profile, projection, PROFILE_DEFAULTS) for profile in profiles]
+        else:
+            etag = None
+            profiles = await profiles_read_collection.find(query, LEADERBOARD_PROJECTION) \
+                .sort(RANKING_SORT).limit(limit).to_list(length=limit)
             
-            result.append(profile_dict)
+            # Validate once here; the response below is rendered as-is
+            result = [leaderboard_entry(profile) for profile in profiles]
+        
+        headers = {"Cache-Control": LEADERBOARD_CACHE_CONTROL}
+        if len(result) == limit:
+            last = result[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last["elo_rating"], last["_id"])
         
-        return result
+        # Entries are already plain validated dicts, so skip FastAPI's re-encoding
+        response = ORJSONResponse(result, headers=headers)
+        
+        # Pages read from the database are identified by their content instead
+        if etag is None:
+            etag = body_etag(response.body)
+            if etag_matches(request, etag):
+                return not_modified(etag, LEADERBOARD_CACHE_CONTROL)
+        response.headers["ETag"] = etag
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/leaderboard/stream")
+async def stream_leaderboard():
+    """Follow the top of the leaderboard as Server-Sent Events
+    
+    Sends a `snapshot` event with the top entries, then `delta` events
+    carrying only the entries whose rank or rating changed and the ids
+    that dropped out. Every event has a sequence number; a client that
+    falls too far behind is sent a fresh snapshot instead of the deltas it
+    missed.
+    """
+    try:
+        subscriber, snapshot = leaderboard_stream.subscribe()
+    except OverflowError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    
+    return StreamingResponse(
+        leaderboard_stream.events_for(subscriber, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/search")
+async def search_profiles(
+    q: Optional[str] = None,
+    club: Optional[str] = None,
+    major: Optional[str] = None,
+    year: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """Search profiles by name or company and filter by club, major and graduation year
+    
+    Every word of `q` must prefix-match a word of the profile's name or one
+    of its companies. Results are ordered like the leaderboard, by
+    (elo_rating, _id) descending, and paginated with the same X-Next-Cursor
+    keyset cursors. Each filter is served by an index ending in that order.
+    """
+    try:
+        try:
+            query = search_filter(q, club, major, year)
+            if cursor:
+                query = {"$and": [query, keyset_filter(cursor)]} if query else keyset_filter(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        profiles = await profiles_read_collection.find(query, LEADERBOARD_PROJECTION) \
+            .sort(RANKING_SORT).limit(limit).to_list(length=limit)
+        
+        result = [leaderboard_entry(profile) for profile in profiles]
+        
+        headers = {}
+        if len(result) == limit:
+            last = result[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last["elo_rating"], last["_id"])
+        
+        return ORJSONResponse(result, headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{profile_id}/rank")
+async def get_profile_rank(
+    profile_id: str,
+    club: Optional[str] = None,
+    major: Optional[str] = None,
+    year: Optional[int] = None
+):
+    """Look up the leaderboard position of a profile
+    
+    One of `club`, `major` or `year` gives the rank within that segment.
+    Answered by bisecting the leaderboard cache while it is fresh;
+    otherwise counts the profiles ranked above it with an index range scan
+    rather than sorting the collection.
+    """
+    try:
+        try:
+            profile_oid = ObjectId(profile_id)
+            segment = parse_segment(club, major, year)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid profile ID format")
+        
+        cached = leaderboard_cache.rank(profile_id, segment)
+        if cached is not None:
+            rank, elo_rating, total = cached
+            return {"profile_id": profile_id, "elo_rating": elo_rating, "rank": rank, "total": total}
+        
+        members = segment_filter(segment)
+        profile = await profiles_read_collection.find_one({"_id": profile_oid, **members}, {"elo_rating": 1})
+        if not profile:
+            detail = "Profile not found" if segment is None else "Profile not found in this segment"
+            raise HTTPException(status_code=404, detail=detail)
+        
+        elo_rating = profile.get("elo_rating", 1500)
+        ahead = await profiles_read_collection.count_documents({
+            **members,
+            "$or": [
+                {"elo_rating": {"$gt": elo_rating}},
+                {"elo_rating": elo_rating, "_id": {"$gt": profile_oid}},
+            ]
+        })
+        
+        if segment is None:
+            total = await profiles_read_collection.estimated_document_count()
+        else:
+            total = await profiles_read_collection.count_documents(members)
+        
+        return {
+            "profile_id": profile_id,
+            "elo_rating": elo_rating,
+            "rank": ahead + 1,
+            "total": total
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -183,19 +495,38 @@ async def request_verification(current_user = Depends(get_current_user)):
             detail="Verification requires a valid Northeastern University email address"
         )
     
-    # Generate verification code
-    verification_code = generate_verification_code()
-    
-    # Update profile with verification code
-    await profiles_collection.update_one(
-        {"_id": ObjectId(current_user["_id"])},
-        {"$set": {"verification_code": verification_code}}
+    # Keep the code the user may already have been sent; only a profile
+    # without one gets a new code. Whatever is stored is what gets sent, so
+    # parallel requests all send the same code.
+    stored = await profiles_collection.find_one_and_update(
+        {"_id": ObjectId(current_user["_id"]), "verification_code": None},
+        {"$set": {"verification_code": generate_verification_code()}},
+        projection={"verification_code": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if stored is None:
+        stored = await profiles_collection.find_one(
+            {"_id": ObjectId(current_user["_id"])},
+            {"verification_code": 1}
+        )
+    if stored is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    verification_code = stored["verification_code"]
     
-    # Print to console for development
-    print(f"VERIFICATION CODE for {current_user['email']}: {verification_code}")
+    if not EMAIL_DELIVERY:
+        return {"message": "Verification code generated - email delivery is off, so nothing was sent"}
     
-    return {"message": "Verification code generated - check console for code"}
+    # Queued for the background sender, so no SMTP round trip happens here
+    try:
+        await send_verification_email(email_outbox_collection, current_user["email"], verification_code)
+    except EmailRateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many verification emails requested, try again later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    return {"message": "Verification code sent - check your email"}
 
 @router.post("/verify-email")
 async def verify_email(verification_data: VerificationRequest, current_user = Depends(get_current_user)):
@@ -223,18 +554,33 @@ async def verify_email(verification_data: VerificationRequest, current_user = De
         {"_id": ObjectId(user["_id"])},
         {
             "$set": {"is_northeastern_verified": True},
-            "$unset": {"verification_code": ""}
+            "$unset": {"verification_code": ""},
+            "$inc": {"version": 1}
         }
     )
     
     if update_result.modified_count == 0:
         raise HTTPException(status_code=500, detail="Failed to update verification status")
     
-    return {"message": "Email verified successfully"}
+    principal_cache.invalidate(user["email"])
+    profile_response_cache.invalidate(str(user["_id"]))
+    
+    # Tokens may carry the verification status, so hand out one that says verified
+    user["is_northeastern_verified"] = True
+    return {
+        "message": "Email verified successfully",
+        "access_token": create_access_token(data=token_claims(user)),
+        "token_type": "bearer"
+    }
 
 @router.get("/{profile_id}", response_model=Profile)
-async def get_profile(profile_id: str):
-    """Get a specific profile"""
+async def get_profile(profile_id: str, request: Request, fields: Optional[str] = None):
+    """Get a specific profile
+    
+    The ETag follows the profile's version counter, so clients and CDNs can
+    revalidate with If-None-Match and get a 304 while nothing has changed.
+    `fields` selects a sparse fieldset as on /random.
+    """
     try:
         print(f"Attempting to fetch profile with ID: {profile_id}")
         
@@ -243,42 +589,40 @@ async def get_profile(profile_id: str):
         except Exception as e:
             print(f"Error converting to ObjectId: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Invalid profile ID format: {str(e)}")
-
-        profile = await profiles_collection.find_one({"_id": profile_oid})
-        if not profile:
-            raise HTTPException(status_code=404, detail="Profile not found")
         
-        # Convert ObjectId to string
-        profile["_id"] = str(profile["_id"])
+        projection = profile_fields(fields)
         
-        # Ensure all required fields exist with defaults
-        if "clubs" not in profile or profile["clubs"] is None:
-            profile["clubs"] = []
+        # Only full profiles go through the response cache
+        cached = profile_response_cache.get(profile_id) if projection is None else None
+        if cached is not None:
+            etag, body = cached
+        else:
+            profile = await profiles_read_collection.find_one(
+                {"_id": profile_oid},
+                VERSIONED_PROFILE_PROJECTION if projection is None else {**projection, "version": 1}
+            )
+            if not profile:
+                raise HTTPException(status_code=404, detail="Profile not found")
             
-        if "experiences" not in profile or profile["experiences"] is None:
-            profile["experiences"] = []
+            etag = profile_etag(profile_id, profile.get("version"))
+            if etag_matches(request, etag):
+                return not_modified(etag, PROFILE_CACHE_CONTROL)
             
-        if "education" not in profile:
-            profile["education"] = {"degree": "", "major": "", "graduation_year": 2025}
-        elif "graduation_year" not in profile["education"]:
-            profile["education"]["graduation_year"] = 2025
-        
-        default_fields = {
-            "elo_rating": 1500,
-            "match_count": 0,
-            "linkedin_url": None,
-            "github_url": None,
-            "is_northeastern_verified": False,
-            "photo_url": profile.get("photo_url", "https://randomuser.me/api/portraits/lego/1.jpg")
-        }
+            if projection is None:
+                # Fill in defaults for missing fields and validate once
+                body = ORJSONResponse(Profile(**profile_response(profile)).dict()).body
+                profile_response_cache.put(profile_id, etag, body)
+            else:
+                body = ORJSONResponse(merge_defaults(profile, projection, PROFILE_DEFAULTS)).body
         
-        # Apply defaults if fields are missing
-        for field, default in default_fields.items():
-            if field not in profile or profile[field] is None:
-                profile[field] = default
+        if etag_matches(request, etag):
+            return not_modified(etag, PROFILE_CACHE_CONTROL)
         
-        print(f"Profile being returned: {profile}")
-        return Profile(**profile)
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL}
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -288,6 +632,7 @@ async def get_profile(profile_id: str):
 @router.put("/{profile_id}", response_model=Profile)
 async def update_profile(
     profile_id: str,
+    background_tasks: BackgroundTasks,
     profile_update: dict = Body(...),
     current_user = Depends(get_current_user)
 ):
@@ -298,7 +643,11 @@ async def update_profile(
             raise HTTPException(status_code=403, detail="Not authorized to update this profile")
 
         # Remove fields that shouldn't be updated
-        protected_fields = ["_id", "email", "hashed_password", "is_northeastern_verified", "elo_rating", "match_count"]
+        protected_fields = [
+            "_id", "email", "hashed_password", "is_northeastern_verified",
+            "elo_rating", "match_count", "rating_deviation", "rating_volatility",
+            "photo_variants", "search_terms", "version"
+        ]
         update_data = {k: v for k, v in profile_update.items() if k not in protected_fields}
         
         # Validate LinkedIn URL
@@ -311,57 +660,72 @@ async def update_profile(
             if not validate_url(update_data["github_url"], "github"):
                 raise HTTPException(status_code=400, detail="Invalid GitHub URL")
         
-        # Handle base64 image (limit file size)
-        if "photo_url" in update_data and update_data["photo_url"].startswith("data:image"):
-            # Very basic check for reasonable size (roughly 10MB limit)
-            if len(update_data["photo_url"]) > 10 * 1024 * 1024:
+        # Move base64 images into the photo store and keep only their path
+        photo = update_data.get("photo_url")
+        photo_data = None
+        if isinstance(photo, str) and photo.startswith("data:image"):
+            # Very basic check for reasonable size before decoding (roughly 10MB limit)
+            if len(photo) > 2 * MAX_PHOTO_BYTES:
                 raise HTTPException(status_code=400, detail="Image file too large (max 10MB)")
             
+            try:
+                content_type, data = decode_data_url(photo)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            digest = await store_photo(data, content_type)
+            update_data["photo_url"] = photo_path(digest)
+            photo_data = data
             print("Updated profile picture with base64 image")
+        
+        # Variants of the previous photo no longer apply
+        if "photo_url" in update_data:
+            update_data["photo_variants"] = None
             
         # Apply updates
         result = await profiles_collection.update_one(
             {"_id": ObjectId(profile_id)},
-            {"$set": update_data}
+            {"$set": update_data, "$inc": {"version": 1}}
         )
         
         if result.modified_count == 0 and len(update_data) > 0:
             print("Warning: No fields were updated")
+        
+        principal_cache.invalidate(current_user["email"])
+        profile_response_cache.invalidate(profile_id)
             
         # Get updated profile
-        updated_profile = await profiles_collection.find_one({"_id": ObjectId(profile_id)})
+        updated_profile = await profiles_collection.find_one(
+            {"_id": ObjectId(profile_id)},
+            {**PROFILE_PROJECTION, "search_terms": 1}
+        )
         if not updated_profile:
             raise HTTPException(status_code=404, detail="Profile not found")
-            
-        updated_profile["_id"] = str(updated_profile["_id"])
         
-        # Ensure all required fields exist with defaults
-        if "clubs" not in updated_profile or updated_profile["clubs"] is None:
-            updated_profile["clubs"] = []
-            
-        if "experiences" not in updated_profile or updated_profile["experiences"] is None:
-            updated_profile["experiences"] = []
-            
-        if "education" not in updated_profile:
-            updated_profile["education"] = {"degree": "", "major": "", "graduation_year": 2025}
-        elif "graduation_year" not in updated_profile["education"]:
-            updated_profile["education"]["graduation_year"] = 2025
-        
-        default_fields = {
-            "elo_rating": 1500,
-            "match_count": 0,
-            "linkedin_url": None,
-            "github_url": None,
-            "is_northeastern_verified": False,
-            "photo_url": updated_profile.get("photo_url", "https://randomuser.me/api/portraits/lego/1.jpg")
-        }
+        # Keep search terms in step with the name and companies they come from
+        stored_terms = updated_profile.pop("search_terms", None)
+        if "name" in update_data or "experiences" in update_data:
+            terms = search_terms(updated_profile)
+            if terms != stored_terms:
+                await profiles_collection.update_one({"_id": ObjectId(profile_id)}, {"$set": {"search_terms": terms}})
+        
+        # Fill in defaults for missing fields
+        updated_profile = profile_response(updated_profile)
+        
+        leaderboard_cache.upsert(updated_profile)
         
-        # Apply defaults if fields are missing
-        for field, default in default_fields.items():
-            if field not in updated_profile or updated_profile[field] is None:
-                updated_profile[field] = default
+        # Thumbnails are rendered after the response is sent
+        if photo_data is not None:
+            background_tasks.add_task(
+                attach_variants,
+                profiles_collection,
+                ObjectId(profile_id),
+                update_data["photo_url"],
+                photo_data,
+                leaderboard_cache.upsert
+            )
         
-        return Profile(**updated_profile)
+        return updated_profile
     except HTTPException:
         raise
     except Exception as e:
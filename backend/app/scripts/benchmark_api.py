@@ -0,0 +1,326 @@
+"""
+End-to-end benchmark of the API under a mixed traffic load.
+
+Requests go through the full ASGI app (middleware, routing, validation,
+serialization) in-process over httpx, against a scratch MongoDB database or
+an in-memory mongomock-motor stand-in. For every dataset size and
+concurrency level, `concurrency` closed-loop clients send a weighted mix of
+requests for --duration seconds; throughput and p50/p95/p99 latency are
+reported per endpoint and written to --output as JSON. --compare prints the
+change against an earlier results file.
+
+    python -m app.scripts.benchmark_api --sizes 1000,10000 --concurrency 1,16 --output after.json --compare before.json
+    python -m app.scripts.benchmark_api --backend mongomock --duration 3
+
+Numbers from the in-memory stand-in measure the app's own overhead, not a
+database; use --backend mongodb for anything resembling production.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+DEFAULT_MIX = "random=35,vote=30,leaderboard=15,profile=15,update=3,login=2"
+PASSWORD = "benchmark-password"
+# Accounts used for logins and profile updates
+ACTIVE_USERS = 50
+# Matchups fetched and votes sent per request by the batch endpoints
+VOTE_BATCH = 10
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the API end to end with a mixed workload")
+    parser.add_argument("--backend", choices=["mongodb", "mongomock"], default="mongodb",
+                        help="Scratch MongoDB database, or the in-memory mongomock-motor stand-in")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma separated profile counts")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma separated client counts")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds measured per run")
+    parser.add_argument("--warmup", type=float, default=1, help="Seconds sent before measuring each run")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="Endpoint weights; endpoints are " + ", ".join(ENDPOINTS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    return parser.parse_args()
+
+async def random_pair(http, rng, users):
+    return await http.get("/api/profiles/random")
+
+async def vote(http, rng, users):
+    profile_id, opponent_id = rng.sample(users["ids"], 2)
+    return await http.put(
+        f"/api/profiles/{profile_id}/vote",
+        json={"opponent_id": opponent_id, "result": rng.choice([0, 1])}
+    )
+
+async def matchups(http, rng, users):
+    response = await http.get("/api/profiles/matchups", params={"n": VOTE_BATCH})
+    if response.status_code == 200:
+        users["tokens"].extend(matchup["token"] for matchup in response.json())
+    return response
+
+async def votes(http, rng, users):
+    # Each request carries VOTE_BATCH votes; tokens come from earlier /matchups calls
+    if len(users["tokens"]) < VOTE_BATCH:
+        await matchups(http, rng, users)
+    batch = [users["tokens"].pop() for _ in range(min(VOTE_BATCH, len(users["tokens"])))]
+    return await http.post(
+        "/api/profiles/votes",
+        json={"votes": [{"token": token, "result": rng.choice([0, 1])} for token in batch]}
+    )
+
+async def leaderboard(http, rng, users):
+    return await http.get("/api/profiles/leaderboard", params={"limit": 100})
+
+async def search(http, rng, users):
+    return await http.get("/api/profiles/search", params={"q": rng.choice(["goo", "ale", "micro", "chen"]), "limit": 20})
+
+async def profile(http, rng, users):
+    return await http.get(f"/api/profiles/{rng.choice(users['ids'])}")
+
+async def update(http, rng, users):
+    profile_id, token = rng.choice(users["active"])
+    return await http.put(
+        f"/api/profiles/{profile_id}",
+        json={"linkedin_url": f"https://linkedin.com/in/benchmark{rng.randrange(10 ** 6)}"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+async def login(http, rng, users):
+    return await http.post("/api/auth/token", data={"username": rng.choice(users["emails"]), "password": PASSWORD})
+
+ENDPOINTS = {
+    "random": random_pair,
+    "vote": vote,
+    "matchups": matchups,
+    "votes": votes,
+    "leaderboard": leaderboard,
+    "search": search,
+    "profile": profile,
+    "update": update,
+    "login": login,
+}
+
+args = parse_args() if __name__ == "__main__" else None
+
+# Run against a scratch database so real profiles are never touched
+os.environ["APP_ENV"] = "development"
+os.environ["DATABASE_NAME"] = os.environ.get("LOADTEST_DATABASE_NAME", "northeastern_ranked_loadtest")
+
+def use_in_memory_database():
+    """Point app.utils.database at mongomock-motor; must run before the app is imported"""
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+        import mongomock.collection
+    except ImportError:
+        sys.exit("--backend mongomock needs the mongomock-motor package (pip install mongomock-motor)")
+
+    # Newer pymongo passes `sort` to bulk updates, which mongomock does not accept yet
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    def add_update_without_sort(self, *update_args, sort=None, **kwargs):
+        return add_update(self, *update_args, **kwargs)
+    mongomock.collection.BulkOperationBuilder.add_update = add_update_without_sort
+
+    import app.utils.database as db
+    db.client.close()
+    db.client = AsyncMongoMockClient()
+    db.database = db.client[db.DATABASE_NAME]
+    db.profiles_collection = db.database.profiles
+    db.profiles_read_collection = db.profiles_collection
+    db.matches_collection = db.database.matches
+    db.email_outbox_collection = db.database.email_outbox
+
+if args is not None and args.backend == "mongomock":
+    use_in_memory_database()
+
+import httpx
+from app.main import app
+from app.utils import database as db
+from app.utils.auth import get_password_hash, create_access_token, token_claims
+from app.utils.leaderboard import leaderboard_cache
+from app.scripts.seed_database import generate_profile, seeded_object_id, SEED_EPOCH
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+async def seed(num_profiles, seed_value, batch_size=5000):
+    """Replace the scratch data with `num_profiles` profiles and warm the in-process caches"""
+    await db.profiles_collection.delete_many({})
+    await db.matches_collection.delete_many({})
+
+    rng = random.Random(seed_value)
+    hashed_password = get_password_hash(PASSWORD)
+    ids, emails, batch = [], [], []
+    for i in range(num_profiles):
+        document = generate_profile(rng, i, hashed_password)
+        document["_id"] = seeded_object_id(SEED_EPOCH, seed_value, i)
+        document["elo_rating"] = int(rng.gauss(1500, 200))
+        document["match_count"] = rng.randrange(200)
+        ids.append(str(document["_id"]))
+        emails.append(document["email"])
+        batch.append(document)
+        if len(batch) >= batch_size:
+            await db.profiles_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.profiles_collection.insert_many(batch, ordered=False)
+
+    await leaderboard_cache.rebuild(db.profiles_read_collection)
+
+    active = [
+        (ids[i], create_access_token(data=token_claims({"_id": ids[i], "email": emails[i]})))
+        for i in range(min(ACTIVE_USERS, num_profiles))
+    ]
+    return {"ids": ids, "emails": emails[:ACTIVE_USERS], "active": active, "tokens": []}
+
+async def run_load(http, users, weights, concurrency, duration, seed_value):
+    """Closed-loop clients sending the weighted mix; returns latencies and statuses per endpoint"""
+    names = list(weights)
+    latencies = {name: [] for name in names}
+    statuses = {name: {} for name in names}
+    deadline = time.perf_counter() + duration
+
+    async def client(number):
+        rng = random.Random(seed_value * 1000 + number)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=[weights[n] for n in names])[0]
+            start = time.perf_counter()
+            response = await ENDPOINTS[name](http, rng, users)
+            latencies[name].append((time.perf_counter() - start) * 1000)
+            statuses[name][response.status_code] = statuses[name].get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+def summarize(latencies, statuses, elapsed):
+    endpoints = {}
+    for name, samples in latencies.items():
+        ordered = sorted(samples)
+        errors = sum(count for status, count in statuses[name].items() if status >= 400)
+        endpoints[name] = {
+            "requests": len(ordered),
+            "errors": errors,
+            "statuses": {str(status): count for status, count in sorted(statuses[name].items())},
+            "throughput": len(ordered) / elapsed,
+            "p50_ms": percentile(ordered, 0.50),
+            "p95_ms": percentile(ordered, 0.95),
+            "p99_ms": percentile(ordered, 0.99),
+            "max_ms": ordered[-1] if ordered else None,
+        }
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {"requests": total, "seconds": elapsed, "throughput": total / elapsed, "endpoints": endpoints}
+
+def print_run(run):
+    print(f"\n{run['profiles']} profiles, {run['concurrency']} clients: "
+          f"{run['requests']} requests, {run['throughput']:.0f} req/s")
+    print(f"  {'endpoint':<12}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, endpoint in run["endpoints"].items():
+        if not endpoint["requests"]:
+            continue
+        print(f"  {name:<12}{endpoint['throughput']:>9.1f}{endpoint['p50_ms']:>10.2f}"
+              f"{endpoint['p95_ms']:>10.2f}{endpoint['p99_ms']:>10.2f}{endpoint['errors']:>8}")
+
+def compare(results, baseline_path):
+    """Print per-endpoint changes against an earlier results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(run["profiles"], run["concurrency"]): run for run in baseline["runs"]}
+
+    def change(new, old):
+        return f"{(new - old) / old:+7.1%}" if new is not None and old else "    n/a"
+
+    print(f"\nChange against {baseline_path} ({baseline['meta'].get('commit') or 'unknown commit'})")
+    for run in results["runs"]:
+        old_run = previous.get((run["profiles"], run["concurrency"]))
+        if old_run is None:
+            continue
+        print(f"  {run['profiles']} profiles, {run['concurrency']} clients: "
+              f"throughput {change(run['throughput'], old_run['throughput'])}")
+        for name, endpoint in run["endpoints"].items():
+            old = old_run["endpoints"].get(name)
+            if not old or not endpoint["requests"] or not old["requests"]:
+                continue
+            print(f"    {name:<12} p50 {change(endpoint['p50_ms'], old['p50_ms'])}  "
+                  f"p99 {change(endpoint['p99_ms'], old['p99_ms'])}  "
+                  f"req/s {change(endpoint['throughput'], old['throughput'])}")
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main(args):
+    weights = parse_mix(args.mix)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    results = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "commit": current_commit(),
+            "backend": args.backend,
+            "database": db.database.name,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "mix": weights,
+            "duration": args.duration,
+            "warmup": args.warmup,
+        },
+        "runs": [],
+    }
+    print(f"Benchmarking against {args.backend} database: {db.database.name}")
+
+    # The lifespan closes the client on exit, so the scratch data is dropped inside it
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+                for size in sizes:
+                    users = await seed(size, args.seed)
+                    for concurrency in concurrency_levels:
+                        if args.warmup:
+                            await run_load(http, users, weights, concurrency, args.warmup, args.seed + 1)
+                        latencies, statuses, elapsed = await run_load(
+                            http, users, weights, concurrency, args.duration, args.seed
+                        )
+                        run = {"profiles": size, "concurrency": concurrency, **summarize(latencies, statuses, elapsed)}
+                        results["runs"].append(run)
+                        print_run(run)
+        finally:
+            await db.client.drop_database(db.database.name)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    asyncio.run(main(args))
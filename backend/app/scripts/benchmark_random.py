@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import random
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# Set environment to development before loading any other modules
+os.environ["APP_ENV"] = "development"
+
+# Load environment variables
+load_dotenv()
+
+from app.utils.database import client, DATABASE_NAME
+from app.models.profile import PROFILE_PROJECTION
+from app.utils.matchmaking import sample_profile_pair
+
+DEFAULT_SIZES = [20, 1000, 10000, 100000, 500000]
+
+def make_profile(index):
+    """Build a small synthetic profile document"""
+    return {
+        "name": f"Benchmark User {index}",
+        "email": f"bench{index}@northeastern.edu",
+        "hashed_password": "x",
+        "photo_url": "https://randomuser.me/api/portraits/lego/1.jpg",
+        "experiences": [{"title": "Software Engineer Intern", "company": "Google"}],
+        "clubs": [],
+        "education": {"degree": "BS", "major": "Computer Science", "graduation_year": 2025},
+        "elo_rating": random.randint(1200, 1800),
+        "match_count": 0,
+        "is_northeastern_verified": False,
+    }
+
+async def grow_collection(collection, current, target, batch_size=10000):
+    """Insert profiles until the collection holds `target` documents"""
+    while current < target:
+        count = min(batch_size, target - current)
+        await collection.insert_many(
+            [make_profile(current + i) for i in range(count)],
+            ordered=False
+        )
+        current += count
+    return current
+
+async def legacy_pair(collection):
+    """The original /random implementation: load everything, sample in Python"""
+    profiles = await collection.find().to_list(length=None)
+    return random.sample(profiles, 2)
+
+async def time_calls(func, requests):
+    """Time `requests` sequential calls and return latencies in milliseconds"""
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return f"p50={statistics.median(latencies):8.2f}ms  p95={p95:8.2f}ms"
+
+async def run_benchmark(sizes, requests, legacy_max):
+    """Measure /random pairing latency at increasing collection sizes"""
+    db = client[f"{DATABASE_NAME}_benchmark"]
+    collection = db.profiles
+
+    await collection.delete_many({})
+    print(f"Benchmarking against database: {db.name}")
+
+    current = 0
+    try:
+        for size in sizes:
+            current = await grow_collection(collection, current, size)
+
+            sampled = await time_calls(
+                lambda: sample_profile_pair(collection, PROFILE_PROJECTION),
+                requests
+            )
+            print(f"{size:>8} profiles  $sample  {summarize(sampled)}")
+
+            if size <= legacy_max:
+                legacy = await time_calls(lambda: legacy_pair(collection), min(requests, 20))
+                print(f"{size:>8} profiles  legacy   {summarize(legacy)}")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark random matchup sampling")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--legacy-max", type=int, default=10000,
+                        help="Largest collection size to run the legacy full-scan sampler on")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.sizes, args.requests, args.legacy_max))
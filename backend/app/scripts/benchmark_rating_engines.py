@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+import numpy as np
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.utils.elo import calculate_elo
+from app.utils.rating_engines import ENGINES
+
+async def legacy_calculate_elo(player_rating, opponent_rating, result, k_factor=32):
+    """calculate_elo as it was declared before: async, with no I/O"""
+    return calculate_elo(player_rating, opponent_rating, result, k_factor)
+
+async def time_legacy(votes):
+    start = time.perf_counter()
+    for i in range(votes):
+        await legacy_calculate_elo(1500, 1520, i & 1)
+        await legacy_calculate_elo(1520, 1500, 1 - (i & 1))
+    return time.perf_counter() - start
+
+def time_plain(votes):
+    start = time.perf_counter()
+    for i in range(votes):
+        calculate_elo(1500, 1520, i & 1)
+        calculate_elo(1520, 1500, 1 - (i & 1))
+    return time.perf_counter() - start
+
+def time_per_vote(engine, votes):
+    player = engine.initial_state()
+    opponent = dict(engine.initial_state(), elo_rating=1520)
+    start = time.perf_counter()
+    for i in range(votes):
+        engine.rate(player, opponent, i & 1)
+    return time.perf_counter() - start
+
+def time_period(engine, players, matches, rng):
+    state = {
+        field: np.full(players, float(value))
+        for field, value in engine.initial_state().items()
+    }
+    state["elo_rating"] = rng.normal(1500, 200, players).round()
+    a = rng.integers(0, players, matches)
+    b = (a + rng.integers(1, players, matches)) % players
+    results = rng.integers(0, 2, matches).astype(np.float64)
+
+    start = time.perf_counter()
+    engine.rate_period(state, a, b, results)
+    return time.perf_counter() - start
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+
+    legacy = asyncio.run(time_legacy(args.votes))
+    print(f"{'async elo':>10}: {legacy / args.votes * 1e6:7.2f}µs per vote")
+    plain = time_plain(args.votes)
+    print(f"{'sync elo':>10}: {plain / args.votes * 1e6:7.2f}µs per vote")
+
+    for name, engine_class in ENGINES.items():
+        engine = engine_class()
+        per_vote = time_per_vote(engine, args.votes)
+        period = time_period(engine, args.players, args.matches, rng)
+        print(f"{name:>10}: {per_vote / args.votes * 1e6:7.2f}µs per vote   "
+              f"rating period of {args.matches} matches / {args.players} players in {period * 1000:.1f}ms "
+              f"({args.matches / period:,.0f} matches/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-vote and batch cost of the rating engines")
+    parser.add_argument("--votes", type=int, default=100000)
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--matches", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+
+    main(parser.parse_args())
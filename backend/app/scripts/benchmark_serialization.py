@@ -0,0 +1,84 @@
+import argparse
+import os
+import random
+import sys
+import time
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.models.profile import LeaderboardEntry
+from app.utils.serialization import ORJSONResponse
+
+DEFAULT_SIZES = [10000, 100000]
+
+def make_documents(count, rng):
+    """Leaderboard documents as they come back from MongoDB"""
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Profile {i}",
+            "photo_url": "https://randomuser.me/api/portraits/lego/1.jpg",
+            "clubs": [{"id": f"club{rng.randrange(40)}", "name": "Club"} for _ in range(rng.randrange(4))],
+            "education": {"degree": "BS", "major": "Computer Science", "graduation_year": 2020 + rng.randrange(8)},
+            "elo_rating": int(rng.gauss(1500, 200)),
+            "match_count": rng.randrange(500),
+        }
+        for i in range(count)
+    ]
+
+def previous_path(documents):
+    """Build entries per request, then let FastAPI encode them and json.dumps the result"""
+    result = []
+    for document in documents:
+        entry = LeaderboardEntry(**document).dict()
+        entry["_id"] = str(document["_id"])
+        result.append(entry)
+    return JSONResponse(jsonable_encoder(result)).body
+
+def validated_path(documents):
+    """Entries validated once from the database, rendered directly by orjson"""
+    result = []
+    for document in documents:
+        entry = LeaderboardEntry(**document).dict()
+        entry["_id"] = str(document["_id"])
+        result.append(entry)
+    return ORJSONResponse(result).body
+
+def cached_path(entries):
+    """Entries already held by the leaderboard cache, rendered directly by orjson"""
+    return ORJSONResponse(entries).body
+
+def best_of(func, argument, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func(argument)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+def main(args):
+    rng = random.Random(args.seed)
+    for size in args.sizes:
+        documents = make_documents(size, rng)
+        entries = [dict(LeaderboardEntry(**document).dict(), _id=str(document["_id"])) for document in documents]
+
+        before, before_bytes = best_of(previous_path, documents, args.repeat)
+        validated, validated_bytes = best_of(validated_path, documents, args.repeat)
+        cached, cached_bytes = best_of(cached_path, entries, args.repeat)
+
+        print(f"{size:>7} entries: before {before * 1000:8.1f}ms ({before_bytes / 1e6:.1f}MB)  "
+              f"database path {validated * 1000:8.1f}ms ({validated_bytes / 1e6:.1f}MB)  "
+              f"cache path {cached * 1000:7.1f}ms  "
+              f"speedup {before / validated:.1f}x / {before / cached:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time leaderboard serialization before and after the orjson path")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+
+    main(parser.parse_args())
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import time
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.scripts.smtp_sink import SMTPSink
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare inline SMTP sends with the email outbox against a local SMTP sink")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--connect-delay", type=float, default=0.05,
+                        help="Seconds per SMTP connection, standing in for TLS and login")
+    parser.add_argument("--message-delay", type=float, default=0.005, help="Seconds per message")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of messages the sink rejects with 451")
+    return parser.parse_args()
+
+args = parse_args()
+sink = SMTPSink(port=0, connect_delay=args.connect_delay, message_delay=args.message_delay,
+                fail_rate=args.fail_rate).start_in_thread()
+
+# Run against a scratch database and the local sink
+os.environ["APP_ENV"] = "development"
+os.environ["DATABASE_NAME"] = os.environ.get("LOADTEST_DATABASE_NAME", "northeastern_ranked_loadtest")
+os.environ.update({
+    "EMAIL_DELIVERY": "true",
+    "EMAIL_USER": "loadtest@northeastern.edu",
+    "EMAIL_PASSWORD": "",
+    "SMTP_HOST": sink.host,
+    "SMTP_PORT": str(sink.port),
+    "SMTP_SECURITY": "none",
+    "EMAIL_RETRY_BASE_SECONDS": os.environ.get("EMAIL_RETRY_BASE_SECONDS", "0.05"),
+    "EMAIL_POLL_INTERVAL_SECONDS": os.environ.get("EMAIL_POLL_INTERVAL_SECONDS", "0.1"),
+})
+
+# Load environment variables
+load_dotenv()
+
+from app.utils.database import client, database, profiles_collection, email_outbox_collection
+from app.utils.email import email_outbox, smtp_connection, verification_message, build_message
+from app.routes.profiles import request_verification
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return latencies[len(latencies) // 2], latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+
+def inline_send(recipient):
+    """The previous path: a new SMTP session per message, on the caller's thread"""
+    subject, text, html = verification_message(recipient, "123456")
+    entry = {"to": recipient, "subject": subject, "text": text, "html": html}
+    server = smtplib.SMTP(sink.host, sink.port)
+    server.sendmail(os.environ["EMAIL_USER"], recipient, build_message(os.environ["EMAIL_USER"], entry).as_string())
+    server.quit()
+
+async def measure_inline(users):
+    """Sends on the event loop, as an async handler calling smtplib would"""
+    latencies = []
+    start = time.perf_counter()
+    for user in users:
+        sent = time.perf_counter()
+        try:
+            inline_send(user["email"])
+        except smtplib.SMTPResponseException:
+            pass
+        latencies.append((time.perf_counter() - sent) * 1000)
+    return latencies, time.perf_counter() - start
+
+async def measure_outbox(users):
+    latencies = []
+    start = time.perf_counter()
+
+    async def one(user):
+        sent = time.perf_counter()
+        await request_verification(current_user=user)
+        latencies.append((time.perf_counter() - sent) * 1000)
+
+    await asyncio.gather(*(one(user) for user in users))
+    accepted = time.perf_counter() - start
+    while email_outbox.sent + email_outbox.failed < len(users):
+        await asyncio.sleep(0.01)
+    return latencies, accepted, time.perf_counter() - start
+
+async def main():
+    print(f"Load testing against database: {database.name}, SMTP sink on port {sink.port}")
+    print(f"{args.requests} verification emails; sink costs {args.connect_delay * 1000:.0f}ms per connection, "
+          f"{args.message_delay * 1000:.0f}ms per message, rejects {args.fail_rate:.0%}")
+    await profiles_collection.delete_many({})
+    await email_outbox_collection.delete_many({})
+    result = await profiles_collection.insert_many([
+        {"name": f"Load Test {i}", "email": f"loadtest{i}@northeastern.edu"} for i in range(args.requests)
+    ])
+    users = [
+        {"_id": str(profile_id), "email": f"loadtest{i}@northeastern.edu"}
+        for i, profile_id in enumerate(result.inserted_ids)
+    ]
+
+    try:
+        connections_before = sink.connections
+        latencies, elapsed = await measure_inline(users)
+        p50, p99 = percentiles(latencies)
+        print(f" inline: request p50/p99 {p50:7.2f}/{p99:7.2f}ms, loop blocked {elapsed:.2f}s in total, "
+              f"{sink.connections - connections_before} SMTP connections")
+
+        connections_before = sink.connections
+        email_outbox.start(email_outbox_collection, smtp_connection(), os.environ["EMAIL_USER"])
+        latencies, accepted, delivered = await measure_outbox(users)
+        p50, p99 = percentiles(latencies)
+        stats = email_outbox.stats()
+        print(f" outbox: request p50/p99 {p50:7.2f}/{p99:7.2f}ms, all queued in {accepted:.2f}s, "
+              f"delivered in {delivered:.2f}s over {sink.connections - connections_before} SMTP connections "
+              f"(sent={stats['sent']} retried={stats['retried']} failed={stats['failed']})")
+    finally:
+        await email_outbox.stop()
+        await client.drop_database(database.name)
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# Run against a scratch database so real accounts are never touched
+os.environ["APP_ENV"] = "development"
+os.environ["DATABASE_NAME"] = os.environ.get("LOADTEST_DATABASE_NAME", "northeastern_ranked_loadtest")
+
+# Load environment variables
+load_dotenv()
+
+from app.utils.database import client, database, profiles_collection
+from app.utils.auth import get_password_hash, verify_password, create_access_token
+from app.utils.hashing import hashing_pool
+from app.routes.auth import login
+from app.routes.profiles import vote_profile, VoteRequest
+
+PASSWORD = "loadtest-password"
+
+async def inline_login(email, password):
+    """The original login path: bcrypt runs on the event loop"""
+    profile = await profiles_collection.find_one({"email": email})
+    if not profile or not verify_password(password, profile["hashed_password"]):
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    return create_access_token(data={"sub": profile["email"]})
+
+async def pooled_login(email, password):
+    """The current login endpoint"""
+    return await login(SimpleNamespace(username=email, password=password))
+
+async def reset_profiles(num_profiles):
+    await profiles_collection.delete_many({})
+    hashed_password = get_password_hash(PASSWORD)
+    docs = [
+        {
+            "name": f"Load Test {i}",
+            "email": f"loadtest{i}@northeastern.edu",
+            "hashed_password": hashed_password,
+            "elo_rating": 1500,
+            "match_count": 0,
+        }
+        for i in range(num_profiles)
+    ]
+    result = await profiles_collection.insert_many(docs)
+    return result.inserted_ids
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return float("nan"), float("nan")
+    return latencies[len(latencies) // 2], latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+
+async def run(name, login_path, args):
+    """Send votes at a steady rate while a burst of logins hits the same worker"""
+    ids = await reset_profiles(args.profiles)
+    rng = random.Random(args.seed)
+    vote_latencies = []
+    outcomes = {"ok": 0, "rejected": 0}
+
+    async def vote(scheduled):
+        a, b = rng.sample(ids, 2)
+        await vote_profile(str(a), VoteRequest(opponent_id=str(b), result=rng.choice([0, 1])))
+        # Measured from when the vote was due, so time spent with the loop
+        # blocked before it could even be sent counts against it
+        vote_latencies.append((time.perf_counter() - scheduled) * 1000)
+
+    async def one_login():
+        email = f"loadtest{rng.randrange(args.profiles)}@northeastern.edu"
+        try:
+            await login_path(email, PASSWORD)
+            outcomes["ok"] += 1
+        except HTTPException as e:
+            if e.status_code != 503:
+                raise
+            outcomes["rejected"] += 1
+
+    async def vote_stream(duration):
+        tasks = []
+        interval = 1 / args.vote_rate
+        start = time.perf_counter()
+        for i in range(int(duration * args.vote_rate)):
+            scheduled = start + i * interval
+            await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+            tasks.append(asyncio.create_task(vote(scheduled)))
+        await asyncio.gather(*tasks)
+
+    # Quiet period first for a baseline
+    await vote_stream(args.duration)
+    baseline = percentiles(vote_latencies)
+    vote_latencies.clear()
+
+    start = time.perf_counter()
+    storm = asyncio.gather(*(one_login() for _ in range(args.logins)))
+    await vote_stream(args.duration)
+    await storm
+    elapsed = time.perf_counter() - start
+    during = percentiles(vote_latencies)
+
+    print(f"{name:>7}: vote p50/p99 {baseline[0]:6.1f}/{baseline[1]:6.1f}ms quiet, "
+          f"{during[0]:7.1f}/{during[1]:7.1f}ms during storm  "
+          f"logins ok={outcomes['ok']} rejected={outcomes['rejected']} in {elapsed:.1f}s")
+
+async def main(args):
+    print(f"Load testing against database: {database.name}")
+    print(f"{args.logins} logins against {args.vote_rate} votes/s; "
+          f"hashing pool of {hashing_pool.workers} workers + {hashing_pool.queue_size} queued")
+    try:
+        await run("inline", inline_login, args)
+        await run("pooled", pooled_login, args)
+    finally:
+        hashing_pool.shutdown()
+        await client.drop_database(database.name)
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure vote latency during a burst of logins")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--vote-rate", type=float, default=200, help="Votes per second")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per phase")
+    parser.add_argument("--profiles", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+
+    asyncio.run(main(parser.parse_args()))
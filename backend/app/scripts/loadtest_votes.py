@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# Run against a scratch database so real ratings are never touched
+os.environ["APP_ENV"] = "development"
+os.environ["DATABASE_NAME"] = os.environ.get("LOADTEST_DATABASE_NAME", "northeastern_ranked_loadtest")
+
+# Load environment variables
+load_dotenv()
+
+from app.utils.database import client, database, profiles_collection, matches_collection
+from app.utils.elo import calculate_elo
+from app.routes.profiles import vote_profile, VoteRequest
+from app.utils.vote_queue import vote_queue
+
+async def legacy_vote(profile_id, opponent_id, result):
+    """The original vote path: two reads, then two $set writes"""
+    profile = await profiles_collection.find_one({"_id": profile_id})
+    opponent = await profiles_collection.find_one({"_id": opponent_id})
+
+    new_profile_rating = calculate_elo(profile["elo_rating"], opponent["elo_rating"], result)
+    new_opponent_rating = calculate_elo(opponent["elo_rating"], profile["elo_rating"], 1 - result)
+
+    await profiles_collection.update_one(
+        {"_id": profile_id},
+        {"$set": {"elo_rating": new_profile_rating}, "$inc": {"match_count": 1}}
+    )
+    await profiles_collection.update_one(
+        {"_id": opponent_id},
+        {"$set": {"elo_rating": new_opponent_rating}, "$inc": {"match_count": 1}}
+    )
+    return new_profile_rating - profile["elo_rating"]
+
+async def atomic_vote(profile_id, opponent_id, result):
+    """The current vote endpoint"""
+    response = await vote_profile(str(profile_id), VoteRequest(opponent_id=str(opponent_id), result=result))
+    return response["rating_changes"]["profile"]
+
+async def reset_profiles(num_opponents):
+    """Create one hot profile and a set of opponents"""
+    await profiles_collection.delete_many({})
+    docs = [
+        {"name": f"Load Test {i}", "email": f"loadtest{i}@northeastern.edu", "elo_rating": 1500, "match_count": 0}
+        for i in range(num_opponents + 1)
+    ]
+    result = await profiles_collection.insert_many(docs)
+    return result.inserted_ids[0], result.inserted_ids[1:]
+
+async def run(name, vote, votes, concurrency, num_opponents, seed):
+    """Fire `votes` votes at the hot profile and check every rating change landed"""
+    hot, opponents = await reset_profiles(num_opponents)
+    rng = random.Random(seed)
+    plan = [(rng.choice(opponents), rng.choice([0, 1])) for _ in range(votes)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(opponent_id, result):
+        async with semaphore:
+            start = time.perf_counter()
+            delta = await vote(hot, opponent_id, result)
+            latencies.append((time.perf_counter() - start) * 1000)
+            return delta
+
+    start = time.perf_counter()
+    deltas = await asyncio.gather(*(one(opponent_id, result) for opponent_id, result in plan))
+    elapsed = time.perf_counter() - start
+
+    final = await profiles_collection.find_one({"_id": hot})
+    expected = 1500 + sum(deltas)
+    lost = abs(final["elo_rating"] - expected)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:>7}: {votes / elapsed:8.0f} votes/s  p50={p50:7.2f}ms  p99={p99:7.2f}ms  "
+          f"match_count={final['match_count']}/{votes}  "
+          f"rating={final['elo_rating']} expected={expected} (off by {lost})")
+
+async def run_write_behind(votes, concurrency, num_opponents, seed):
+    """Fire votes through the write-behind queue and time acceptance and application"""
+    hot, opponents = await reset_profiles(num_opponents)
+    rng = random.Random(seed)
+    plan = [(rng.choice(opponents), rng.choice([0, 1])) for _ in range(votes)]
+    vote_queue.max_size = max(vote_queue.max_size, votes)
+    await vote_queue.start(profiles_collection, matches_collection)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(opponent_id, result):
+        async with semaphore:
+            await vote_profile(str(hot), VoteRequest(opponent_id=str(opponent_id), result=result))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(opponent_id, result) for opponent_id, result in plan))
+    accepted = time.perf_counter() - start
+    await vote_queue.drain()
+    applied = time.perf_counter() - start
+
+    final = await profiles_collection.find_one({"_id": hot})
+    print(f" queued: {votes / accepted:8.0f} votes/s accepted, {votes / applied:8.0f} votes/s applied "
+          f"in {vote_queue.batches} batches  match_count={final['match_count']}/{votes}")
+
+async def main(args):
+    print(f"Load testing against database: {database.name}")
+    try:
+        await run("legacy", legacy_vote, args.votes, args.concurrency, args.opponents, args.seed)
+        await run("atomic", atomic_vote, args.votes, args.concurrency, args.opponents, args.seed)
+        if args.write_behind:
+            await run_write_behind(args.votes, args.concurrency, args.opponents, args.seed)
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fire concurrent votes at one hot profile")
+    parser.add_argument("--votes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--opponents", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--write-behind", action="store_true",
+                        help="Also measure the write-behind vote queue")
+
+    asyncio.run(main(parser.parse_args()))
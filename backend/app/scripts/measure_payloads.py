@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# Run against a scratch database so real profiles are never touched
+os.environ["APP_ENV"] = "development"
+os.environ["DATABASE_NAME"] = os.environ.get("LOADTEST_DATABASE_NAME", "northeastern_ranked_loadtest")
+
+# Load environment variables
+load_dotenv()
+
+import httpx
+from app.main import app
+from app.utils.database import client, database, profiles_collection
+from app.utils.compression import RESPONSE_COMPRESSION
+
+COMPANIES = ["Google", "Microsoft", "Amazon", "Meta", "Apple", "Northeastern University", "MIT", "IBM"]
+TITLES = ["Software Engineer Intern", "Research Assistant", "Teaching Assistant",
+          "Machine Learning Engineer", "Full Stack Developer", "Data Scientist"]
+DESCRIPTIONS = [
+    "Developed new features for the company's main product",
+    "Conducted research in the field of artificial intelligence",
+    "Built and deployed machine learning models",
+    "Created responsive web applications using React",
+]
+MAJORS = ["Computer Science", "Data Science", "Cybersecurity", "Computer Engineering"]
+CLUBS = ["Sandbox", "Generate", "Oasis", "Women in Tech", "Husky Hackers", "NU Robotics"]
+
+def make_profiles(count, rng):
+    """Profiles shaped like the seeded ones; the password hash is a placeholder"""
+    profiles = []
+    for i in range(count):
+        username = f"payload{i}"
+        profiles.append({
+            "name": f"Payload Profile {i}",
+            "email": f"{username}@northeastern.edu",
+            "hashed_password": "x" * 60,
+            "photo_url": f"https://randomuser.me/api/portraits/men/{rng.randrange(100)}.jpg",
+            "experiences": [
+                {
+                    "title": rng.choice(TITLES),
+                    "company": rng.choice(COMPANIES),
+                    "description": rng.choice(DESCRIPTIONS),
+                }
+                for _ in range(rng.randint(2, 3))
+            ],
+            "clubs": [{"id": f"club{j}", "name": name} for j, name in enumerate(rng.sample(CLUBS, rng.randrange(4)))],
+            "education": {"degree": "BS", "major": rng.choice(MAJORS), "graduation_year": rng.randint(2022, 2028)},
+            "elo_rating": int(rng.gauss(1500, 200)),
+            "match_count": rng.randrange(500),
+            "linkedin_url": f"https://linkedin.com/in/{username}",
+            "github_url": f"https://github.com/{username}",
+            "is_northeastern_verified": False,
+        })
+    return profiles
+
+async def wire_bytes(http, path, encoding):
+    """Bytes of the response body as sent, before any decompression"""
+    response = await http.get(path, headers={"Accept-Encoding": encoding})
+    response.raise_for_status()
+    return response.num_bytes_downloaded, response.headers.get("content-encoding", "identity")
+
+async def main(args):
+    print(f"Measuring payloads against database: {database.name}")
+    await profiles_collection.delete_many({})
+    result = await profiles_collection.insert_many(make_profiles(args.profiles, random.Random(args.seed)))
+    profile_id = str(result.inserted_ids[0])
+
+    encodings = ["identity", "gzip"]
+    if RESPONSE_COMPRESSION == "br":
+        encodings.append("br")
+
+    paths = [
+        ("profile", f"/api/profiles/{profile_id}"),
+        ("profile, card fields", f"/api/profiles/{profile_id}?fields=name,photo_url,elo_rating"),
+        ("random pair", "/api/profiles/random"),
+        ("random pair, card fields", "/api/profiles/random?fields=name,photo_url,photo_variants,education"),
+        (f"leaderboard {args.limit}", f"/api/profiles/leaderboard?limit={args.limit}"),
+        (f"leaderboard {args.limit}, rank fields", f"/api/profiles/leaderboard?limit={args.limit}&fields=name,photo_url"),
+    ]
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://payloads") as http:
+                print(f"{'endpoint':<32}" + "".join(f"{encoding:>16}" for encoding in encodings))
+                baseline = {}
+                for label, path in paths:
+                    row = []
+                    for encoding in encodings:
+                        size, applied = await wire_bytes(http, path, encoding)
+                        # Sparse rows compare against the full response they slim down
+                        reference = baseline.setdefault(label.split(",")[0], size)
+                        row.append(f"{size:>8} ({size / reference:>4.0%})" if applied == encoding
+                                   else f"{size:>8} (none)")
+                    print(f"{label:<32}" + "".join(f"{cell:>16}" for cell in row))
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure response sizes with compression and sparse fieldsets")
+    parser.add_argument("--profiles", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100, help="Leaderboard page size")
+    parser.add_argument("--seed", type=int, default=0)
+
+    asyncio.run(main(parser.parse_args()))
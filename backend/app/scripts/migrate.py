@@ -0,0 +1,59 @@
+"""
+Create the API's indexes and apply pending schema migrations.
+
+The API does the same at startup unless RUN_MIGRATIONS_ON_STARTUP is off;
+run this before deploying when building indexes on a large collection
+should not delay startup.
+
+    python -m app.scripts.migrate
+    python -m app.scripts.migrate --status
+"""
+import argparse
+import asyncio
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# Load environment variables
+load_dotenv()
+
+from app.utils.database import client, database, DATABASE_NAME
+from app.utils.migrations import ensure_indexes, run_migrations, migration_status
+
+async def show_status():
+    for migration in await migration_status(database):
+        state = migration["state"]
+        if state is None:
+            description = "pending"
+        elif state.get("status") == "applied":
+            description = f"applied {state['applied_at']:%Y-%m-%d %H:%M:%S} in {state['seconds']:.3f}s"
+        else:
+            description = f"{state.get('status')} since {state['started_at']:%Y-%m-%d %H:%M:%S}"
+        print(f"{migration['version']:>4}  {migration['name']:<32} {description}")
+
+async def migrate(indexes_only):
+    print(f"Provisioning database: {DATABASE_NAME}")
+    for report in await ensure_indexes(database):
+        outcome = f"failed: {report['error']}" if report["error"] else "ok"
+        print(f"index {report['collection']}.{report['name']:<20} {report['seconds']:8.3f}s  {outcome}")
+
+    if indexes_only:
+        return
+
+    reports = await run_migrations(database)
+    if not reports:
+        print("No pending migrations")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create indexes and apply schema migrations")
+    parser.add_argument("--status", action="store_true", help="List migrations and whether they have run")
+    parser.add_argument("--indexes-only", action="store_true", help="Only create indexes")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(show_status() if args.status else migrate(args.indexes_only))
+    finally:
+        client.close()
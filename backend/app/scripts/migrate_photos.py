@@ -0,0 +1,125 @@
+"""
+Move inline base64 profile photos into the photo store.
+
+Each `data:image` photo_url is decoded, stored in GridFS and replaced with
+the short path it is served from, together with its thumbnail variants.
+Photos that fail to decode are left alone and reported. Running it again
+only touches photos that are still inline; --backfill-variants also renders
+variants for stored photos that do not have them yet.
+
+    python -m app.scripts.migrate_photos --dry-run
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# Load environment variables
+load_dotenv()
+
+from app.utils.database import client, DATABASE_NAME, profiles_collection
+from app.utils.photos import (
+    decode_data_url, store_photo, store_variants, photo_path, open_photo, shutdown_executor, PHOTO_PATH
+)
+
+async def migrate_photo(profile, semaphore, dry_run):
+    async with semaphore:
+        content_type, data = decode_data_url(profile["photo_url"])
+        if dry_run:
+            return None, len(profile["photo_url"]), len(data)
+        digest = await store_photo(data, content_type)
+        variants = await store_variants(data)
+        # Only replace the photo if it has not been changed since we read it
+        operation = UpdateOne(
+            {"_id": profile["_id"], "photo_url": profile["photo_url"]},
+            {"$set": {"photo_url": photo_path(digest), "photo_variants": variants}, "$inc": {"version": 1}}
+        )
+        return operation, len(profile["photo_url"]), len(data)
+
+async def backfill_variants(profile, semaphore, dry_run):
+    async with semaphore:
+        digest = profile["photo_url"].rsplit("/", 1)[-1]
+        grid_out = await open_photo(digest)
+        if grid_out is None:
+            raise ValueError(f"Photo {digest} is missing from the store")
+        data = await grid_out.read()
+        if dry_run:
+            return None, 0, len(data)
+        variants = await store_variants(data)
+        operation = UpdateOne(
+            {"_id": profile["_id"], "photo_url": profile["photo_url"]},
+            {"$set": {"photo_variants": variants}, "$inc": {"version": 1}}
+        )
+        return operation, 0, len(data)
+
+async def migrate_photos(dry_run, concurrency, batch_size, variants_only):
+    print(f"Migrating {'photo variants' if variants_only else 'inline photos'} in database: {DATABASE_NAME}")
+    semaphore = asyncio.Semaphore(concurrency)
+    migrated = failed = inline_bytes = stored_bytes = 0
+    migrate = backfill_variants if variants_only else migrate_photo
+
+    async def run_batch(batch):
+        nonlocal migrated, failed, inline_bytes, stored_bytes
+        outcomes = await asyncio.gather(
+            *(migrate(profile, semaphore, dry_run) for profile in batch),
+            return_exceptions=True
+        )
+        operations = []
+        for profile, outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                failed += 1
+                print(f"Skipping photo of {profile['_id']}: {outcome}")
+                continue
+            operation, inline_size, stored_size = outcome
+            migrated += 1
+            inline_bytes += inline_size
+            stored_bytes += stored_size
+            if operation is not None:
+                operations.append(operation)
+        if operations:
+            await profiles_collection.bulk_write(operations, ordered=False)
+
+    if variants_only:
+        query = {
+            "photo_url": {"$regex": f"^{re.escape(PHOTO_PATH)}"},
+            "photo_variants": None
+        }
+    else:
+        query = {"photo_url": {"$regex": "^data:image"}}
+
+    batch = []
+    cursor = profiles_collection.find(query, {"photo_url": 1}).batch_size(batch_size)
+
+    async for profile in cursor:
+        batch.append(profile)
+        if len(batch) >= batch_size:
+            await run_batch(batch)
+            batch = []
+
+    if batch:
+        await run_batch(batch)
+
+    action = "would move" if dry_run else "moved"
+    print(f"{migrated} photos {action} ({inline_bytes / 1e6:.1f}MB inline, {stored_bytes / 1e6:.1f}MB decoded), "
+          f"{failed} failed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move inline base64 photos out of profile documents")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without writing")
+    parser.add_argument("--concurrency", type=int, default=8, help="Photos uploaded at once")
+    parser.add_argument("--batch-size", type=int, default=100, help="Profiles per bulk update")
+    parser.add_argument("--backfill-variants", action="store_true",
+                        help="Render variants for photos already in the store instead")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(migrate_photos(args.dry_run, args.concurrency, args.batch_size, args.backfill_variants))
+    finally:
+        shutdown_executor()
+        client.close()
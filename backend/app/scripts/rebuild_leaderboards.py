@@ -0,0 +1,83 @@
+"""
+Build the global and segment leaderboards in one streaming pass and report on them.
+
+Each API worker keeps its own copy and rebuilds it on startup and every
+LEADERBOARD_RESYNC_SECONDS; this runs the same rebuild against the
+configured database to time it, size the segments and print any one of them.
+
+    python -m app.scripts.rebuild_leaderboards --show club:sandbox --top 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# Load environment variables
+load_dotenv()
+
+from app.utils.database import client, DATABASE_NAME, profiles_read_collection
+from app.utils.leaderboard import LeaderboardCache, SEGMENT_FIELDS
+
+def parse_segment_argument(value):
+    kind, _, segment_value = value.partition(":")
+    if kind not in SEGMENT_FIELDS or not segment_value:
+        raise argparse.ArgumentTypeError(f"Expected one of {', '.join(SEGMENT_FIELDS)} followed by :value")
+    return kind, int(segment_value) if kind == "year" else segment_value
+
+def time_queries(cache, segment, top, samples, rng):
+    """Mean microseconds for a top-N page and for a rank lookup within `segment`"""
+    members = [entry["_id"] for entry in cache.page(len(cache), segment=segment)]
+    start = time.perf_counter()
+    for _ in range(samples):
+        cache.page(top, segment=segment)
+    page_us = (time.perf_counter() - start) / samples * 1e6
+
+    picks = [rng.choice(members) for _ in range(samples)]
+    start = time.perf_counter()
+    for profile_id in picks:
+        cache.rank(profile_id, segment)
+    rank_us = (time.perf_counter() - start) / samples * 1e6
+    return page_us, rank_us
+
+async def rebuild_leaderboards(args):
+    print(f"Rebuilding leaderboards from database: {DATABASE_NAME}")
+    cache = LeaderboardCache(max_staleness=float("inf"))
+    await cache.rebuild(profiles_read_collection)
+    print(f"{len(cache)} profiles and {cache.stats()['segments']} segments in {cache.last_rebuild_seconds:.2f}s "
+          f"({len(cache) / max(cache.last_rebuild_seconds, 1e-9):,.0f} profiles/s)")
+
+    sizes = sorted(cache.segment_sizes().items(), key=lambda item: -item[1])
+    print("Largest segments:")
+    for (kind, value), size in sizes[:args.largest]:
+        print(f"  {kind}:{value}  {size}")
+
+    if len(cache):
+        rng = random.Random(0)
+        for label, segment in [("global", None)] + [(f"{kind}:{value}", (kind, value)) for (kind, value), _ in sizes[:1]]:
+            page_us, rank_us = time_queries(cache, segment, args.top, args.samples, rng)
+            print(f"{label}: top {args.top} in {page_us:.1f}us, rank in {rank_us:.1f}us")
+
+    if args.show:
+        kind, value = args.show
+        print(f"Top {args.top} for {kind}:{value}:")
+        for position, entry in enumerate(cache.page(args.top, segment=args.show), 1):
+            print(f"{position:>4}. {entry['name']}  {entry['elo_rating']}  ({entry['_id']})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the global and segment leaderboards and report on them")
+    parser.add_argument("--show", type=parse_segment_argument, help="Segment to print, such as club:sandbox or year:2026")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--largest", type=int, default=10, help="How many of the largest segments to list")
+    parser.add_argument("--samples", type=int, default=1000, help="Lookups timed per query type")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(rebuild_leaderboards(args))
+    finally:
+        client.close()
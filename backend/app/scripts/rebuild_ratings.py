@@ -0,0 +1,77 @@
+"""
+Recompute every profile's rating from the match log.
+
+The replay is deterministic, so running this repeatedly leaves the same
+ratings behind. Profiles that never played are reset to the initial rating.
+Pause voting (or enable write-behind and stop the workers) while it runs,
+otherwise votes landing mid-rebuild are overwritten.
+
+    python -m app.scripts.rebuild_ratings --dry-run --k-factor 24
+"""
+import argparse
+import asyncio
+import os
+import sys
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# Load environment variables
+load_dotenv()
+
+from app.utils.database import client, DATABASE_NAME, profiles_collection, matches_collection
+from app.utils.replay import replay_ratings
+from app.utils.rating_engines import rating_engine
+
+async def rebuild_ratings(k_factor, initial_rating, dry_run, batch_size=1000):
+    print(f"Replaying match log in database: {DATABASE_NAME}")
+    replay = await replay_ratings(matches_collection, initial_rating=initial_rating, k_factor=k_factor)
+    print(f"Replayed {replay['matches']} matches for {len(replay['ratings'])} profiles "
+          f"in {replay['seconds']:.2f}s ({replay['matches'] / max(replay['seconds'], 1e-9):.0f} matches/s)")
+
+    ratings, match_counts = replay["ratings"], replay["match_counts"]
+    changed = 0
+    operations = []
+
+    async for profile in profiles_collection.find({}, {"elo_rating": 1, "match_count": 1}):
+        new_rating = ratings.get(profile["_id"], initial_rating)
+        new_count = match_counts.get(profile["_id"], 0)
+        if profile.get("elo_rating") == new_rating and profile.get("match_count") == new_count:
+            continue
+
+        changed += 1
+        operations.append(UpdateOne(
+            {"_id": profile["_id"]},
+            {"$set": {"elo_rating": new_rating, "match_count": new_count}, "$inc": {"version": 1}}
+        ))
+        if len(operations) >= batch_size and not dry_run:
+            await profiles_collection.bulk_write(operations, ordered=False)
+            operations = []
+
+    if operations and not dry_run:
+        await profiles_collection.bulk_write(operations, ordered=False)
+
+    top = sorted(ratings.items(), key=lambda item: -item[1])[:10]
+    print("Top 10 after replay:")
+    for position, (profile_id, rating) in enumerate(top, 1):
+        print(f"{position:>3}. {profile_id}  {rating}")
+
+    action = "would change" if dry_run else "updated"
+    print(f"{changed} profiles {action}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild ratings by replaying the match log")
+    parser.add_argument("--k-factor", type=float, default=32)
+    parser.add_argument("--initial-rating", type=int, default=1500)
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    args = parser.parse_args()
+
+    if rating_engine.name != "elo":
+        parser.error(f"Replay recomputes ELO ratings; RATING_ENGINE is set to {rating_engine.name}")
+
+    try:
+        asyncio.run(rebuild_ratings(args.k_factor, args.initial_rating, args.dry_run))
+    finally:
+        client.close()
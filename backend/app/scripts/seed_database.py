@@ -1,7 +1,25 @@
+"""
+Seed the database with generated profiles and, optionally, a match history.
+
+Profiles are generated and inserted in streamed batches, so millions of
+them never sit in memory at once. Every profile shares one password hash.
+Matches are simulated between profiles with hidden strengths drawn from a
+normal distribution, rated with ELO in vectorized chunks, and written to
+the match log; profiles are then stored with the ratings and match counts
+that history produced. The same --seed produces the same data, ids included
+(pass --password-hash as well for identical password hashes).
+
+    python -m app.scripts.seed_database --profiles 1000000 --matches 5000000 --seed 7
+"""
+import argparse
 import asyncio
 import os
 import sys
 import random
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from bson import ObjectId
 from dotenv import load_dotenv
 
 # Add the parent directory to the path so we can import our app modules
@@ -13,133 +31,238 @@ os.environ["APP_ENV"] = "development"
 # Load environment variables
 load_dotenv()
 
-from app.utils.database import MONGODB_URI, DATABASE_NAME
-from motor.motor_asyncio import AsyncIOMotorClient
+from app.utils.database import client, database, DATABASE_NAME
 from app.utils.auth import get_password_hash
+from app.utils.replay import apply_elo_chunk
+from app.utils.search import search_terms
+
+first_names = ["Alex", "Jordan", "Morgan", "Taylor", "Casey", "Riley", "Dylan", "Avery",
+               "Jamie", "Quinn", "Blake", "Charlie", "Skyler", "Sam", "Reese", "Finley"]
+
+last_names = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+              "Rodriguez", "Martinez", "Chen", "Kim", "Nguyen", "Singh", "Patel", "Wilson"]
+
+companies = ["Google", "Microsoft", "Amazon", "Meta", "Apple", "Netflix", "Uber", "Airbnb",
+             "Northeastern University", "MIT", "Harvard", "IBM", "Intel", "Salesforce"]
+
+job_titles = ["Software Engineer Intern", "Research Assistant", "Teaching Assistant",
+              "Machine Learning Engineer", "Full Stack Developer", "Data Scientist",
+              "DevOps Engineer", "Product Manager Intern", "Mobile Developer"]
+
+job_descriptions = [
+    "Developed new features for the company's main product",
+    "Conducted research in the field of artificial intelligence",
+    "Assisted professor with course materials and grading",
+    "Built and deployed machine learning models",
+    "Created responsive web applications using React",
+    "Analyzed large datasets to derive business insights",
+    "Maintained and improved cloud infrastructure",
+    "Conducted user research and product planning"
+]
+
+majors = ["Computer Science", "Computer Engineering", "Data Science",
+          "Artificial Intelligence", "Cybersecurity", "Software Engineering",
+          "Information Systems", "Computer Science and Business Administration"]
+
+degrees = ["BS", "MS", "PhD"]
+
+clubs = [("sandbox", "Sandbox"), ("generate", "Generate"), ("oasis", "Oasis"), ("wit", "Women in Tech"),
+         ("acm", "ACM"), ("robotics", "NU Robotics"), ("hackbeanpot", "HackBeanpot"), ("disrupt", "Disrupt")]
+
+# Profiles and matches get ids stamped from this date, so a seed always produces the same ids
+SEED_EPOCH = datetime(2024, 9, 1)
+
+def seeded_object_id(when, seed, counter):
+    """Deterministic ObjectId: timestamp, then the seed, then a per-collection counter"""
+    timestamp = int((when - datetime(1970, 1, 1)).total_seconds())
+    return ObjectId(f"{timestamp:08x}{seed % 2 ** 32:08x}{counter:08x}")
+
+def generate_profile(rng, index, hashed_password):
+    """One synthetic profile; `index` keeps emails unique"""
+    first_name = rng.choice(first_names)
+    last_name = rng.choice(last_names)
+    username = f"{first_name.lower()}{last_name.lower()}{index}"
+
+    profile = {
+        "name": f"{first_name} {last_name}",
+        "email": f"{username}@northeastern.edu",
+        "hashed_password": hashed_password,
+        "photo_url": f"https://randomuser.me/api/portraits/{rng.choice(['men', 'women'])}/{rng.randint(1, 99)}.jpg",
+        "experiences": [
+            {
+                "title": rng.choice(job_titles),
+                "company": rng.choice(companies),
+                "description": rng.choice(job_descriptions)
+            }
+            for _ in range(rng.randint(2, 3))
+        ],
+        "clubs": [{"id": club_id, "name": club_name} for club_id, club_name in rng.sample(clubs, rng.randint(0, 3))],
+        "education": {
+            "degree": rng.choice(degrees),
+            "major": rng.choice(majors),
+            "graduation_year": rng.randint(2022, 2028)
+        },
+        "elo_rating": 1500,
+        "match_count": 0,
+        "linkedin_url": f"https://linkedin.com/in/{username}",
+        "github_url": f"https://github.com/{username}",
+        "is_northeastern_verified": False
+    }
+    profile["search_terms"] = search_terms(profile)
+    return profile
+
+class BulkWriter:
+    """
+    Keeps up to `concurrency` unordered insert_many calls in flight.
+
+    Batches are handed over as they are generated, so generation overlaps
+    with the inserts already on the wire.
+    """
+
+    def __init__(self, collection, concurrency):
+        self.collection = collection
+        self.inserted = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._pending = set()
+
+    async def _insert(self, documents):
+        try:
+            result = await self.collection.insert_many(documents, ordered=False)
+            self.inserted += len(result.inserted_ids)
+        finally:
+            self._slots.release()
+
+    async def write(self, documents):
+        await self._slots.acquire()
+        task = asyncio.create_task(self._insert(documents))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        # Surface failures from batches that already finished
+        for done in [t for t in self._pending if t.done()]:
+            done.result()
 
-async def generate_profiles(num_profiles=20):
-    """Generate test profiles locally"""
-    print("Generating profiles locally...")
-    
-    first_names = ["Alex", "Jordan", "Morgan", "Taylor", "Casey", "Riley", "Dylan", "Avery", 
-                  "Jamie", "Quinn", "Blake", "Charlie", "Skyler", "Sam", "Reese", "Finley"]
-    
-    last_names = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
-                 "Rodriguez", "Martinez", "Chen", "Kim", "Nguyen", "Singh", "Patel", "Wilson"]
-    
-    companies = ["Google", "Microsoft", "Amazon", "Meta", "Apple", "Netflix", "Uber", "Airbnb",
-                "Northeastern University", "MIT", "Harvard", "IBM", "Intel", "Salesforce"]
-    
-    job_titles = ["Software Engineer Intern", "Research Assistant", "Teaching Assistant",
-                 "Machine Learning Engineer", "Full Stack Developer", "Data Scientist",
-                 "DevOps Engineer", "Product Manager Intern", "Mobile Developer"]
-    
-    job_descriptions = [
-        "Developed new features for the company's main product",
-        "Conducted research in the field of artificial intelligence",
-        "Assisted professor with course materials and grading",
-        "Built and deployed machine learning models",
-        "Created responsive web applications using React",
-        "Analyzed large datasets to derive business insights",
-        "Maintained and improved cloud infrastructure",
-        "Conducted user research and product planning"
-    ]
-    
-    majors = ["Computer Science", "Computer Engineering", "Data Science", 
-             "Artificial Intelligence", "Cybersecurity", "Software Engineering",
-             "Information Systems", "Computer Science and Business Administration"]
-    
-    degrees = ["BS", "MS", "PhD"]
-    
-    profiles = []
-    
-    for _ in range(num_profiles):
-        first_name = random.choice(first_names)
-        last_name = random.choice(last_names)
-        full_name = f"{first_name} {last_name}"
-        
-        # Create username and email
-        username = f"{first_name.lower()}{last_name.lower()}{random.randint(1, 99)}"
-        email = f"{username}@northeastern.edu"  # Make them all Northeastern emails
-        password = "password123"  # Default password for testing
-        hashed_password = get_password_hash(password)
-        
-        # Random photo
-        gender = random.choice(["men", "women"])
-        photo_number = random.randint(1, 99)
-        
-        # Random experiences (2-3)
-        num_experiences = random.randint(2, 3)
-        experiences = []
-        
-        for _ in range(num_experiences):
-            company = random.choice(companies)
-            title = random.choice(job_titles)
-            description = random.choice(job_descriptions)
-            
-            experiences.append({
-                "title": title,
-                "company": company,
-                "description": description
+    async def close(self):
+        await asyncio.gather(*self._pending)
+
+def report(label, count, seconds):
+    print(f"{label}: {count} documents in {seconds:.2f}s ({count / max(seconds, 1e-9):,.0f} docs/s)")
+
+async def seed_matches(args, profile_ids, strengths, ratings, match_counts, offset=0):
+    """Simulate, rate and insert the match history; updates ratings and match_counts in place"""
+    rng = np.random.default_rng(args.seed)
+    writer = BulkWriter(database.matches, args.concurrency)
+    interval = timedelta(days=args.days) / max(args.matches, 1)
+    start = time.perf_counter()
+
+    for first in range(0, args.matches, args.batch_size):
+        size = min(args.batch_size, args.matches - first)
+        players_a = rng.integers(0, len(profile_ids), size)
+        # Offset by 1..n-1 so nobody plays themselves
+        players_b = (players_a + rng.integers(1, len(profile_ids), size)) % len(profile_ids)
+        # Outcomes follow the hidden strengths, on the ELO logistic curve
+        expected_a = 1 / (1 + 10 ** ((strengths[players_b] - strengths[players_a]) / 400))
+        results = (rng.random(size) < expected_a).astype(np.int64)
+
+        before, after = apply_elo_chunk(ratings, players_a.tolist(), players_b.tolist(), results, args.k_factor)
+        match_counts += np.bincount(np.concatenate([players_a, players_b]), minlength=len(match_counts))
+
+        # Plain Python values; indexing numpy arrays per element is far slower
+        documents = []
+        for i, (a, b, result, rating_before, rating_after) in enumerate(zip(
+            players_a.tolist(), players_b.tolist(), results.tolist(),
+            before.astype(np.int64).tolist(), after.astype(np.int64).tolist()
+        )):
+            played_at = SEED_EPOCH + interval * (first + i)
+            documents.append({
+                "_id": seeded_object_id(played_at, args.seed, offset + first + i),
+                "profile_id": profile_ids[a],
+                "opponent_id": profile_ids[b],
+                "result": result,
+                "played_at": played_at,
+                "ratings_before": rating_before,
+                "ratings_after": rating_after,
             })
-        
-        # Random education
-        degree = random.choice(degrees)
-        major = random.choice(majors)
-        grad_year = random.randint(2022, 2025)
-        
-        profile = {
-            "name": full_name,
-            "email": email,
-            "hashed_password": hashed_password,
-            "photo_url": f"https://randomuser.me/api/portraits/{gender}/{photo_number}.jpg",
-            "experiences": experiences,
-            "education": {
-                "degree": degree,
-                "major": major,
-                "graduation_year": grad_year
-            },
-            "elo_rating": 1500,
-            "match_count": 0,
-            "linkedin_url": f"https://linkedin.com/in/{username}",
-            "github_url": f"https://github.com/{username}",
-            "is_northeastern_verified": False
-        }
-        
-        profiles.append(profile)
-        print(f"Generated profile for {full_name} ({email}) with password: {password}")
-    
-    return profiles
-
-async def seed_database():
+        await writer.write(documents)
+
+    await writer.close()
+    report("Matches", writer.inserted, time.perf_counter() - start)
+
+async def seed_profiles(args, profile_ids, ratings, match_counts, hashed_password, offset=0):
+    """Generate and insert profiles in streamed batches"""
+    rng = random.Random(args.seed)
+    writer = BulkWriter(database.profiles, args.concurrency)
+    start = time.perf_counter()
+
+    for first in range(0, args.profiles, args.batch_size):
+        documents = []
+        for i in range(first, min(first + args.batch_size, args.profiles)):
+            profile = generate_profile(rng, offset + i, hashed_password)
+            profile["_id"] = profile_ids[i]
+            profile["elo_rating"] = int(ratings[i])
+            profile["match_count"] = int(match_counts[i])
+            documents.append(profile)
+        await writer.write(documents)
+
+        if args.profiles <= 20:
+            for profile in documents:
+                print(f"Generated profile for {profile['name']} ({profile['email']}) with password: {args.password}")
+
+    await writer.close()
+    report("Profiles", writer.inserted, time.perf_counter() - start)
+
+async def seed_database(args):
     """Seed the database with generated test profiles"""
-    # Connect to MongoDB
-    client = AsyncIOMotorClient(MONGODB_URI)
-    db = client[DATABASE_NAME]
-    
     print(f"Connected to database: {DATABASE_NAME}")
-    
-    # Clear existing profiles
-    await db.profiles.delete_many({})
-    print("Cleared existing profiles")
-    
-    # Generate profiles
-    profiles = await generate_profiles(num_profiles=20)
-    
-    if not profiles:
-        print("Failed to generate profiles")
-        return
-    
-    print(f"Successfully generated {len(profiles)} profiles")
-    
-    # Insert profiles
-    result = await db.profiles.insert_many(profiles)
-    
-    print(f"Added {len(result.inserted_ids)} generated profiles to the database")
-    for i, profile_id in enumerate(result.inserted_ids):
-        name = profiles[i].get("name", f"Profile {i+1}")
-        print(f"{i+1}. {name} (ID: {profile_id})")
+
+    if args.append:
+        # Continue numbering after what is there so ids and emails stay unique
+        profile_offset = await database.profiles.count_documents({})
+        match_offset = await database.matches.count_documents({})
+    else:
+        await database.profiles.delete_many({})
+        await database.matches.delete_many({})
+        print("Cleared existing profiles and matches")
+        profile_offset = match_offset = 0
+
+    # bcrypt once; every seeded account shares the password
+    hashed_password = args.password_hash or get_password_hash(args.password)
+
+    np_rng = np.random.default_rng([args.seed, 1])
+    strengths = np_rng.normal(1500, args.rating_spread, args.profiles)
+    profile_ids = [seeded_object_id(SEED_EPOCH, args.seed, profile_offset + i) for i in range(args.profiles)]
+    match_counts = np.zeros(args.profiles, dtype=np.int64)
+
+    start = time.perf_counter()
+    if args.matches:
+        # Ratings start equal and spread out as the simulated history plays
+        ratings = np.full(args.profiles, 1500.0)
+        await seed_matches(args, profile_ids, strengths, ratings, match_counts, match_offset)
+    else:
+        # No history to earn ratings from; use the hidden strengths directly
+        ratings = np.round(strengths)
+
+    await seed_profiles(args, profile_ids, ratings, match_counts, hashed_password, profile_offset)
+    report("Total", args.profiles + args.matches, time.perf_counter() - start)
 
 if __name__ == "__main__":
-    asyncio.run(seed_database())
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Seed the database with synthetic profiles and matches")
+    parser.add_argument("--profiles", type=int, default=20)
+    parser.add_argument("--matches", type=int, default=0, help="Synthetic matches to simulate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per insert_many")
+    parser.add_argument("--concurrency", type=int, default=4, help="insert_many calls in flight")
+    parser.add_argument("--password", default="password123", help="Shared password for every profile")
+    parser.add_argument("--password-hash", help="Precomputed bcrypt hash to store instead of hashing --password")
+    parser.add_argument("--rating-spread", type=float, default=200, help="Standard deviation of hidden strengths")
+    parser.add_argument("--k-factor", type=float, default=32)
+    parser.add_argument("--days", type=float, default=90, help="Days the match history spans")
+    parser.add_argument("--append", action="store_true", help="Keep existing profiles and matches")
+    args = parser.parse_args()
+
+    if args.profiles < 2 and args.matches:
+        parser.error("Matches need at least two profiles")
+
+    try:
+        asyncio.run(seed_database(args))
+    finally:
+        client.close()
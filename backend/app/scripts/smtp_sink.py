@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import random
+import threading
+
+class SMTPSink:
+    """
+    Minimal local SMTP server that accepts and discards mail.
+
+    Stands in for the real relay so delivery can be exercised without network
+    access. `connect_delay` is paid once per connection, like a TLS handshake
+    and login; `message_delay` once per message. `fail_rate` answers that
+    share of messages with a temporary 451 so retries can be observed.
+    Plain SMTP only: point the app at it with SMTP_SECURITY=none.
+    """
+
+    def __init__(self, host="127.0.0.1", port=1025, connect_delay=0.0, message_delay=0.0,
+                 fail_rate=0.0, seed=0, verbose=False):
+        self.host = host
+        self.port = port
+        self.connect_delay = connect_delay
+        self.message_delay = message_delay
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self.connections = 0
+        self.accepted = 0
+        self.rejected = 0
+        self._rng = random.Random(seed)
+        self._server = None
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.connect_delay)
+        writer.write(b"220 localhost SMTP sink\r\n")
+        recipients = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("ascii", "replace").strip()
+                verb = command[:4].upper()
+                if verb in ("EHLO", "HELO"):
+                    writer.write(b"250-localhost\r\n250 8BITMIME\r\n" if verb == "EHLO" else b"250 localhost\r\n")
+                elif verb == "MAIL":
+                    recipients = []
+                    writer.write(b"250 OK\r\n")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[-1].strip(" <>"))
+                    writer.write(b"250 OK\r\n")
+                elif verb == "DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        pass
+                    await asyncio.sleep(self.message_delay)
+                    if self._rng.random() < self.fail_rate:
+                        self.rejected += 1
+                        writer.write(b"451 Temporary failure, try again later\r\n")
+                    else:
+                        self.accepted += 1
+                        if self.verbose:
+                            print(f"Accepted message for {', '.join(recipients)}")
+                        writer.write(b"250 OK\r\n")
+                elif verb in ("RSET", "NOOP"):
+                    writer.write(b"250 OK\r\n")
+                elif verb == "QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"502 Command not implemented\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    def start_in_thread(self):
+        """Serve from a daemon thread with its own event loop; returns once listening"""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.serve())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="smtp-sink", daemon=True).start()
+        ready.wait()
+        return self
+
+async def main(args):
+    sink = SMTPSink(args.host, args.port, args.connect_delay, args.message_delay, args.fail_rate, verbose=True)
+    server = await sink.serve()
+    print(f"SMTP sink listening on {args.host}:{sink.port}")
+    async with server:
+        try:
+            await server.serve_forever()
+        finally:
+            print(f"{sink.connections} connections, {sink.accepted} accepted, {sink.rejected} rejected")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP server that accepts and discards mail")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--connect-delay", type=float, default=0.0, help="Seconds per connection")
+    parser.add_argument("--message-delay", type=float, default=0.0, help="Seconds per message")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of messages answered with 451")
+
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -1,16 +1,21 @@
 from datetime import datetime, timedelta
+import os
 import secrets
 from jose import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from ..utils.database import profiles_collection
+from ..utils.hashing import hashing_pool, HashingPoolFull
+from ..utils.principals import principal_cache, PRINCIPAL_PROJECTION
 from bson import ObjectId
 
 # Security configurations
 SECRET_KEY = "your-secret-key-replace-in-production"  # Use env variable in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 10080
+# Put the profile id and verification status in tokens so requests can skip the database
+TOKEN_EMBED_CLAIMS = os.environ.get("TOKEN_EMBED_CLAIMS", "").lower() in ("1", "true", "yes")
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -24,6 +29,27 @@ def get_password_hash(password):
     """Generate password hash"""
     return pwd_context.hash(password)
 
+def _pool_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+async def verify_password_pooled(plain_password, hashed_password):
+    """Verify a password on the hashing pool without blocking the event loop"""
+    try:
+        return await hashing_pool.run(verify_password, plain_password, hashed_password)
+    except HashingPoolFull:
+        raise _pool_busy_exception()
+
+async def get_password_hash_pooled(password):
+    """Hash a password on the hashing pool without blocking the event loop"""
+    try:
+        return await hashing_pool.run(get_password_hash, password)
+    except HashingPoolFull:
+        raise _pool_busy_exception()
+
 def create_access_token(data: dict):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -31,6 +57,20 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def token_claims(profile):
+    """
+    Claims for a profile's access token.
+
+    With TOKEN_EMBED_CLAIMS on, the token also carries the profile id and
+    verification status. Verification only ever goes from false to true, so
+    a stale claim can under-report it but never grant it.
+    """
+    claims = {"sub": profile["email"]}
+    if TOKEN_EMBED_CLAIMS:
+        claims["pid"] = str(profile["_id"])
+        claims["nuv"] = bool(profile.get("is_northeastern_verified", False))
+    return claims
+
 def generate_verification_code():
     """Generate a random verification code"""
     return secrets.token_urlsafe(16)
@@ -49,14 +89,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         email = payload.get("sub")
         if email is None:
             raise credentials_exception
+        
+        # Tokens with embedded claims need no lookup at all
+        if "pid" in payload:
+            return {
+                "_id": payload["pid"],
+                "email": email,
+                "is_northeastern_verified": payload.get("nuv", False),
+            }
+        
+        profile = principal_cache.get(email)
+        if profile is not None:
+            return profile
             
         # Find the user in the database
-        profile = await profiles_collection.find_one({"email": email})
+        profile = await profiles_collection.find_one({"email": email}, PRINCIPAL_PROJECTION)
         if profile is None:
             raise credentials_exception
             
         # Convert _id to string for serialization
         profile["_id"] = str(profile["_id"])
+        principal_cache.put(email, profile)
         return profile
         
     except jwt.JWTError:
@@ -0,0 +1,62 @@
+import os
+from starlette.middleware.gzip import GZipMiddleware
+
+# "br" (brotli, with gzip for clients that do not accept it), "gzip" or "off"
+RESPONSE_COMPRESSION = os.environ.get("RESPONSE_COMPRESSION", "gzip").lower()
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get("COMPRESSION_MINIMUM_SIZE", "1000"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+# Already-compressed images gain nothing from another pass, and a
+# compressor buffering an event stream would hold events back
+UNCOMPRESSED_PREFIXES = ("/api/photos/", "/api/profiles/leaderboard/stream")
+
+def _skip_prefixes(middleware_class):
+    """Wrap a compression middleware so requests under UNCOMPRESSED_PREFIXES bypass it"""
+
+    class Selective(middleware_class):
+        async def __call__(self, scope, receive, send):
+            if scope["type"] == "http" and scope["path"].startswith(UNCOMPRESSED_PREFIXES):
+                await self.app(scope, receive, send)
+                return
+            await super().__call__(scope, receive, send)
+
+    Selective.__name__ = f"Selective{middleware_class.__name__}"
+    return Selective
+
+def install_compression(app):
+    """
+    Add the configured response compression middleware to `app`.
+
+    Brotli needs the optional brotli-asgi package; without it the app
+    falls back to gzip.
+
+    Returns:
+        Name of the compression actually installed
+    """
+    mode = RESPONSE_COMPRESSION
+    if mode == "br":
+        try:
+            from brotli_asgi import BrotliMiddleware
+        except ImportError:
+            print("RESPONSE_COMPRESSION=br but brotli-asgi is not installed; using gzip")
+            mode = "gzip"
+        else:
+            app.add_middleware(
+                _skip_prefixes(BrotliMiddleware),
+                quality=BROTLI_QUALITY,
+                minimum_size=COMPRESSION_MINIMUM_SIZE,
+                gzip_fallback=True
+            )
+
+    if mode == "gzip":
+        app.add_middleware(
+            _skip_prefixes(GZipMiddleware),
+            minimum_size=COMPRESSION_MINIMUM_SIZE,
+            compresslevel=GZIP_LEVEL
+        )
+    elif mode not in ("br", "off"):
+        raise ValueError(f"Unknown RESPONSE_COMPRESSION: {RESPONSE_COMPRESSION}")
+
+    return mode
@@ -1,6 +1,11 @@
 import motor.motor_asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from .metrics import mongodb_command_seconds, mongodb_command_failures, METRICS_ENABLED
+from pymongo.monitoring import CommandListener, ConnectionPoolListener
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 
 # Load environment variables
 env = os.environ.get("APP_ENV", "development")
@@ -9,7 +14,174 @@ load_dotenv(f".env.{env}")
 MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
 DATABASE_NAME = os.environ.get("DATABASE_NAME", f"northeastern_ranked_{env}")
 
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
+# Client options read from the environment, as (variable, client keyword, type).
+# Unset variables keep the driver's defaults.
+CLIENT_SETTINGS = [
+    ("MONGODB_MAX_POOL_SIZE", "maxPoolSize", int),
+    ("MONGODB_MIN_POOL_SIZE", "minPoolSize", int),
+    ("MONGODB_MAX_IDLE_TIME_MS", "maxIdleTimeMS", int),
+    ("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "waitQueueTimeoutMS", int),
+    ("MONGODB_CONNECT_TIMEOUT_MS", "connectTimeoutMS", int),
+    ("MONGODB_SOCKET_TIMEOUT_MS", "socketTimeoutMS", int),
+    ("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "serverSelectionTimeoutMS", int),
+    # Comma separated list such as "zstd,snappy,zlib"
+    ("MONGODB_COMPRESSORS", "compressors", str),
+    ("MONGODB_APP_NAME", "appname", str),
+]
+
+# Read preference for read-mostly paths (leaderboard, rank, profile views),
+# e.g. "secondaryPreferred". Writes and read-after-write paths always use the primary.
+MONGODB_READ_PREFERENCE = os.environ.get("MONGODB_READ_PREFERENCE", "primary")
+MONGODB_MAX_STALENESS_SECONDS = int(os.environ.get("MONGODB_MAX_STALENESS_SECONDS", "-1"))
+
+def client_options():
+    """Keyword arguments for the Motor client built from the environment"""
+    options = {}
+    for variable, keyword, cast in CLIENT_SETTINGS:
+        value = os.environ.get(variable)
+        if value:
+            options[keyword] = cast(value)
+    return options
+
+READ_PREFERENCES = {
+    "primarypreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondarypreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def read_preference():
+    """The read preference configured for read-mostly paths"""
+    name = MONGODB_READ_PREFERENCE.lower()
+    if name == "primary":
+        return Primary()
+    if name not in READ_PREFERENCES:
+        raise ValueError(f"Unknown MONGODB_READ_PREFERENCE: {MONGODB_READ_PREFERENCE}")
+    return READ_PREFERENCES[name](max_staleness=MONGODB_MAX_STALENESS_SECONDS)
+
+class PoolMetrics(ConnectionPoolListener):
+    """
+    Connection pool counters fed by the driver's pool events.
+
+    Events fire on the driver's worker threads, so updates take a lock. Wait
+    time is measured from check-out start to check-out on the same thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkins = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.max_pool_size = None
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = time.perf_counter() - getattr(self._local, "started", time.perf_counter())
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checkins += 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    # Remaining pool events carry nothing we count
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "in_use": self.checkouts - self.checkins,
+                "open_connections": self.connections_created - self.connections_closed,
+                "mean_wait_ms": self.total_wait / self.checkouts * 1000 if self.checkouts else None,
+                "max_wait_ms": self.max_wait * 1000,
+                "max_pool_size": self.max_pool_size,
+            }
+
+pool_metrics = PoolMetrics()
+
+class CommandMetrics(CommandListener):
+    """
+    Times every MongoDB command, labelled by collection and command name.
+
+    The driver reports each command's duration when it completes, but only
+    the started event names the collection, so it is remembered until then.
+    """
+
+    def __init__(self):
+        self._collections = {}  # (connection id, request id) -> collection
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            # getMore names its cursor first; admin commands have no collection
+            target = event.command.get("collection", "") if event.command_name == "getMore" else ""
+        self._collections[(event.connection_id, event.request_id)] = target
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongodb_command_seconds.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongodb_command_seconds.observe(event.duration_micros / 1e6, collection, event.command_name)
+        mongodb_command_failures.inc(collection, event.command_name)
+
+command_metrics = CommandMetrics()
+
+# Motor connects lazily, so creating the client at import time opens no sockets;
+# the app closes it on shutdown and scripts close it when they finish.
+client = motor.motor_asyncio.AsyncIOMotorClient(
+    MONGODB_URI,
+    event_listeners=[pool_metrics, command_metrics] if METRICS_ENABLED else [pool_metrics],
+    **client_options()
+)
+pool_metrics.max_pool_size = client.options.pool_options.max_pool_size
 database = client[DATABASE_NAME]
 
 profiles_collection = database.profiles
+matches_collection = database.matches
+email_outbox_collection = database.email_outbox
+photos_bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(database, bucket_name="photos")
+
+# Profiles for read-mostly paths that tolerate replication lag
+profiles_read_collection = profiles_collection.with_options(read_preference=read_preference())
+
+def close_client():
+    """Close every pooled connection"""
+    client.close()
@@ -1,4 +1,4 @@
-async def calculate_elo(player_rating, opponent_rating, result, k_factor=32):
+def calculate_elo(player_rating, opponent_rating, result, k_factor=32):
     """
     Calculate new ELO rating.
     
@@ -1,27 +1,60 @@
+import asyncio
 import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
 
-def send_verification_email(recipient_email, verification_code):
-    sender_email = os.environ.get("EMAIL_USER")
-    password = os.environ.get("EMAIL_PASSWORD")
-    
-    message = MIMEMultipart("alternative")
-    message["Subject"] = "Verify your Northeastern CS Ranked account"
-    message["From"] = sender_email
-    message["To"] = recipient_email
-    
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "465"))
+# "ssl" (implicit TLS), "starttls" or "none"
+SMTP_SECURITY = os.environ.get("SMTP_SECURITY", "ssl").lower()
+SMTP_TIMEOUT_SECONDS = float(os.environ.get("SMTP_TIMEOUT_SECONDS", "10"))
+
+# Deliver through the outbox; without SMTP credentials codes are only printed
+EMAIL_DELIVERY = os.environ.get(
+    "EMAIL_DELIVERY", "true" if os.environ.get("EMAIL_USER") else "false"
+).lower() in ("1", "true", "yes")
+EMAIL_POLL_INTERVAL_SECONDS = float(os.environ.get("EMAIL_POLL_INTERVAL_SECONDS", "1"))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = float(os.environ.get("EMAIL_RETRY_BASE_SECONDS", "5"))
+EMAIL_RETRY_MAX_SECONDS = float(os.environ.get("EMAIL_RETRY_MAX_SECONDS", "600"))
+# A message claimed this long ago by a sender that never finished is claimed again
+EMAIL_CLAIM_TIMEOUT_SECONDS = float(os.environ.get("EMAIL_CLAIM_TIMEOUT_SECONDS", "120"))
+# Open connections are reused until idle this long or after this many messages
+EMAIL_CONNECTION_IDLE_SECONDS = float(os.environ.get("EMAIL_CONNECTION_IDLE_SECONDS", "30"))
+EMAIL_MESSAGES_PER_CONNECTION = int(os.environ.get("EMAIL_MESSAGES_PER_CONNECTION", "100"))
+# Messages one recipient can be sent per window
+EMAIL_RECIPIENT_LIMIT = int(os.environ.get("EMAIL_RECIPIENT_LIMIT", "5"))
+EMAIL_RECIPIENT_WINDOW_SECONDS = int(os.environ.get("EMAIL_RECIPIENT_WINDOW_SECONDS", "3600"))
+# Per-recipient send counters, kept next to the outbox collection
+EMAIL_RATE_LIMIT_COLLECTION = "email_rate_limits"
+
+class EmailRateLimited(Exception):
+    """Raised when a recipient has been sent too many messages recently"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many emails; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+def verification_message(recipient_email, verification_code):
+    """Subject, plain text and HTML bodies of a verification email"""
+    subject = "Verify your Northeastern CS Ranked account"
+
     text = f"""
     Hello,
-    
+
     Please verify your Northeastern CS Ranked account by entering this code: {verification_code}
-    
+
     Thank you,
     Northeastern CS Ranked Team
     (This website is not affiliated with, endorsed by, or connected to Northeastern University)
     """
-    
+
     html = f"""
     <html>
       <body>
@@ -32,17 +65,335 @@ def send_verification_email(recipient_email, verification_code):
       </body>
     </html>
     """
-    
-    part1 = MIMEText(text, "plain")
-    part2 = MIMEText(html, "html")
-    
-    message.attach(part1)
-    message.attach(part2)
-    
-    try:
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        server.login(sender_email, password)
-        server.sendmail(sender_email, recipient_email, message.as_string())
-        server.quit()
-    except Exception as e:
-        print(f"Error sending email: {e}")
+
+    return subject, text, html
+
+def build_message(sender_email, entry):
+    """MIME message for an outbox entry"""
+    message = MIMEMultipart("alternative")
+    message["Subject"] = entry["subject"]
+    message["From"] = sender_email
+    message["To"] = entry["to"]
+
+    message.attach(MIMEText(entry["text"], "plain"))
+    message.attach(MIMEText(entry["html"], "html"))
+    return message
+
+def is_permanent_failure(error):
+    """Whether retrying `error` cannot help, such as a rejected recipient"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        # Credentials can be fixed without losing the queued mail
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+def retry_delay(attempts):
+    """Exponential backoff before attempt number `attempts + 1`"""
+    return min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+
+class SMTPConnection:
+    """
+    One reusable SMTP session.
+
+    smtplib is blocking, so every call runs on a single dedicated thread;
+    the event loop only awaits it. The session is reopened when the server
+    drops it, after `max_messages` messages and when idle for `idle_timeout`.
+    """
+
+    def __init__(self, host, port, security="ssl", username=None, password=None,
+                 timeout=10, idle_timeout=30, max_messages=100):
+        self.host = host
+        self.port = port
+        self.security = security
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+        self._server = None
+        self._sent_on_connection = 0
+        self._last_used = 0.0
+        self.connections_opened = 0
+
+    def _open(self):
+        if self.security == "ssl":
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self._server = server
+        self._sent_on_connection = 0
+        self.connections_opened += 1
+
+    def _close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def _send(self, sender, recipient, payload):
+        expired = time.monotonic() - self._last_used > self.idle_timeout
+        if self._server is not None and (expired or self._sent_on_connection >= self.max_messages):
+            self._close()
+        if self._server is None:
+            self._open()
+        try:
+            self._server.sendmail(sender, recipient, payload)
+        except smtplib.SMTPServerDisconnected:
+            # The server closed a session we still thought was open; one fresh try
+            self._server = None
+            self._open()
+            self._server.sendmail(sender, recipient, payload)
+        self._sent_on_connection += 1
+        self._last_used = time.monotonic()
+
+    async def send(self, sender, recipient, payload):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._send, sender, recipient, payload)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # The server refused this message; sendmail has reset the session for the next one
+            raise
+        except Exception:
+            # Leave no half-used session behind for the next message
+            await loop.run_in_executor(self._executor, self._close)
+            raise
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=False)
+
+class EmailOutbox:
+    """
+    Persistent email queue backed by the `email_outbox` collection.
+
+    Handlers enqueue and return; a background task claims due messages one
+    at a time and sends them over a reused SMTP connection. Failed sends are
+    retried with exponential backoff until EMAIL_MAX_ATTEMPTS, permanent
+    rejections are not retried. Claims expire, so messages held by a worker
+    that died are picked up by another one. Delivery is at-least-once.
+    """
+
+    def __init__(self, poll_interval=1, max_attempts=6, claim_timeout=120,
+                 recipient_limit=5, recipient_window=3600):
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        self.recipient_limit = recipient_limit
+        self.recipient_window = recipient_window
+        self.sender_email = None
+        self.enqueued = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self._collection = None
+        self._connection = None
+        self._worker = None
+        self._wakeup = None
+
+    @property
+    def running(self):
+        return self._worker is not None
+
+    def start(self, collection, connection, sender_email):
+        """Start sending queued messages through `connection`"""
+        self._collection = collection
+        self._connection = connection
+        self.sender_email = sender_email
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the sender; unsent messages stay queued for the next start"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def enqueue(self, collection, recipient, subject, text, html, kind="message"):
+        """
+        Queue a message for delivery.
+
+        Raises:
+            EmailRateLimited: If `recipient` already reached the per-window limit
+        """
+        now = datetime.utcnow()
+        await self._admit(collection.database[EMAIL_RATE_LIMIT_COLLECTION], recipient, now)
+
+        await collection.insert_one({
+            "kind": kind,
+            "to": recipient,
+            "subject": subject,
+            "text": text,
+            "html": html,
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now,
+            "next_attempt_at": now,
+        })
+        self.enqueued += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _admit(self, limits, recipient, now):
+        """
+        Count a message against the recipient's fixed window, atomically.
+
+        Each recipient has one counter document. A send either increments
+        a counter whose window is open and below the limit, restarts a
+        counter whose window has closed, or creates the counter; each step
+        is a single conditional write, so parallel requests cannot all
+        slip past the limit the way a count-then-insert could.
+
+        Raises:
+            EmailRateLimited: If the recipient's window is already full
+        """
+        window = timedelta(seconds=self.recipient_window)
+        for _ in range(3):
+            counted = await limits.update_one(
+                {"_id": recipient, "window_start": {"$gt": now - window}, "count": {"$lt": self.recipient_limit}},
+                {"$inc": {"count": 1}}
+            )
+            if counted.matched_count:
+                return
+
+            restarted = await limits.update_one(
+                {"_id": recipient, "window_start": {"$lte": now - window}},
+                {"$set": {"window_start": now, "count": 1, "expires_at": now + window}}
+            )
+            if restarted.matched_count:
+                return
+
+            try:
+                await limits.insert_one({"_id": recipient, "window_start": now, "count": 1, "expires_at": now + window})
+                return
+            except DuplicateKeyError:
+                pass
+
+            # The counter exists; either the window is full or another request changed it meanwhile
+            counter = await limits.find_one({"_id": recipient})
+            if counter is not None and counter["window_start"] > now - window and counter["count"] >= self.recipient_limit:
+                self.rate_limited += 1
+                retry_after = counter["window_start"] + window - now
+                raise EmailRateLimited(max(int(retry_after.total_seconds()), 1))
+
+        self.rate_limited += 1
+        raise EmailRateLimited(1)
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        return await self._collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "claimed_at": {"$lt": now - timedelta(seconds=self.claim_timeout)}},
+            ]},
+            {"$set": {"status": "sending", "claimed_at": now}, "$inc": {"attempts": 1}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _deliver(self, entry):
+        payload = build_message(self.sender_email, entry).as_string()
+        try:
+            await self._connection.send(self.sender_email, entry["to"], payload)
+        except Exception as e:
+            if is_permanent_failure(e) or entry["attempts"] >= self.max_attempts:
+                self.failed += 1
+                print(f"Giving up on email to {entry['to']} after {entry['attempts']} attempts: {e}")
+                update = {"status": "failed", "last_error": str(e)}
+            else:
+                self.retried += 1
+                delay = retry_delay(entry["attempts"])
+                update = {
+                    "status": "pending",
+                    "last_error": str(e),
+                    "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+                }
+            await self._collection.update_one({"_id": entry["_id"]}, {"$set": update})
+            return
+
+        self.sent += 1
+        await self._collection.update_one(
+            {"_id": entry["_id"]},
+            {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$unset": {"last_error": ""}}
+        )
+
+    async def _run(self):
+        while True:
+            try:
+                entry = await self._claim()
+            except Exception as e:
+                print(f"Could not claim queued email: {e}")
+                entry = None
+
+            if entry is not None:
+                try:
+                    await self._deliver(entry)
+                except Exception as e:
+                    # The claim times out and the message is tried again
+                    print(f"Could not record delivery of queued email: {e}")
+                continue
+
+            # Nothing due: sleep until the next poll or a local enqueue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "connections_opened": self._connection.connections_opened if self._connection else 0,
+        }
+
+email_outbox = EmailOutbox(
+    poll_interval=EMAIL_POLL_INTERVAL_SECONDS,
+    max_attempts=EMAIL_MAX_ATTEMPTS,
+    claim_timeout=EMAIL_CLAIM_TIMEOUT_SECONDS,
+    recipient_limit=EMAIL_RECIPIENT_LIMIT,
+    recipient_window=EMAIL_RECIPIENT_WINDOW_SECONDS
+)
+
+def smtp_connection():
+    """SMTP connection configured from the environment"""
+    return SMTPConnection(
+        SMTP_HOST,
+        SMTP_PORT,
+        security=SMTP_SECURITY,
+        username=os.environ.get("EMAIL_USER"),
+        password=os.environ.get("EMAIL_PASSWORD"),
+        timeout=SMTP_TIMEOUT_SECONDS,
+        idle_timeout=EMAIL_CONNECTION_IDLE_SECONDS,
+        max_messages=EMAIL_MESSAGES_PER_CONNECTION
+    )
+
+async def send_verification_email(outbox_collection, recipient_email, verification_code):
+    """
+    Queue a verification email; the outbox sender delivers it.
+
+    Raises:
+        EmailRateLimited: If the recipient was sent too many emails recently
+    """
+    subject, text, html = verification_message(recipient_email, verification_code)
+    await email_outbox.enqueue(outbox_collection, recipient_email, subject, text, html, kind="verification")
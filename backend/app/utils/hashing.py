@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# bcrypt releases the GIL while hashing, so threads run in parallel. Leave a
+# core for the event loop, or hashing threads starve it of CPU instead.
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+# Calls allowed to wait for a worker before new ones are turned away
+HASH_QUEUE_SIZE = int(os.environ.get("HASH_QUEUE_SIZE", "16"))
+
+class HashingPoolFull(Exception):
+    """Raised when the hashing pool has no room for another call"""
+
+class HashingPool:
+    """
+    Bounded thread pool for password hashing.
+
+    At most `workers` hashes run at once and at most `queue_size` more wait
+    for a worker. Anything beyond that is rejected immediately, so a login
+    storm is answered with quick 503s instead of an ever-growing backlog.
+    """
+
+    def __init__(self, workers=1, queue_size=16):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hashing")
+        return self._executor
+
+    async def run(self, func, *args):
+        """
+        Run `func(*args)` on a hashing thread.
+
+        Raises:
+            HashingPoolFull: If every worker is busy and the queue is full
+        """
+        if self.in_flight >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise HashingPoolFull()
+
+        self.in_flight += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            # Time spent queued before a worker picked the call up
+            waited = time.perf_counter() - submitted
+            return waited, func(*args)
+
+        try:
+            loop = asyncio.get_running_loop()
+            waited, result = await loop.run_in_executor(self._get_executor(), timed)
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "mean_wait_seconds": self.total_wait / self.completed if self.completed else None,
+            "max_wait_seconds": self.max_wait,
+        }
+
+hashing_pool = HashingPool(workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE)
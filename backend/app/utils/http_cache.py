@@ -0,0 +1,100 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from fastapi import Response
+
+# Cache-Control for shared caches (CDN) and browsers. Profiles change with
+# every vote, so browsers revalidate while a CDN may hold them briefly.
+PROFILE_CACHE_CONTROL = os.environ.get(
+    "PROFILE_CACHE_CONTROL", "public, max-age=0, s-maxage=10, stale-while-revalidate=30"
+)
+LEADERBOARD_CACHE_CONTROL = os.environ.get(
+    "LEADERBOARD_CACHE_CONTROL", "public, max-age=5, s-maxage=15, stale-while-revalidate=60"
+)
+
+# In-process cache of rendered profile responses; 0 disables it
+PROFILE_RESPONSE_CACHE_SIZE = int(os.environ.get("PROFILE_RESPONSE_CACHE_SIZE", "0"))
+PROFILE_RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("PROFILE_RESPONSE_CACHE_TTL_SECONDS", "5"))
+
+def etag_matches(request, etag):
+    """Whether the request's If-None-Match already names `etag`"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def not_modified(etag, cache_control):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def body_etag(body):
+    """ETag derived from the response bytes themselves"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def profile_etag(profile_id, version):
+    """ETag for a profile at a given version"""
+    return f'"p-{profile_id}-{version or 0}"'
+
+class ResponseCache:
+    """
+    Bounded TTL + LRU cache of rendered responses as (etag, body).
+
+    Only changes made by this worker invalidate entries; the TTL bounds how
+    long a change made by another worker can go unnoticed.
+    """
+
+    def __init__(self, max_size=0, ttl=5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires at, etag, body)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        cached = self._entries.get(key)
+        if cached is None or cached[0] < time.monotonic():
+            if cached is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return cached[1], cached[2]
+
+    def put(self, key, etag, body):
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, etag, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+profile_response_cache = ResponseCache(
+    max_size=PROFILE_RESPONSE_CACHE_SIZE,
+    ttl=PROFILE_RESPONSE_CACHE_TTL_SECONDS
+)
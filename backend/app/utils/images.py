@@ -0,0 +1,39 @@
+import io
+from PIL import Image, ImageOps
+
+# Square sizes rendered for every uploaded photo
+VARIANT_SIZES = {
+    "thumb": 96,
+    "card": 400,
+}
+VARIANT_FORMAT = "WEBP"
+VARIANT_CONTENT_TYPE = "image/webp"
+VARIANT_QUALITY = 80
+
+def render_variants(data, sizes=VARIANT_SIZES):
+    """
+    Render the fixed-size variants of an image.
+
+    Pure CPU work with no I/O so it can run in a worker process.
+
+    Args:
+        data: Original image bytes
+        sizes: Mapping of variant name to edge length in pixels
+
+    Returns:
+        Dict mapping variant name to encoded image bytes
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # Respect camera rotation, then drop alpha/palette modes WebP handles poorly
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+        variants = {}
+        for name, size in sizes.items():
+            # Center-crop to a square; never upscale small originals
+            edge = min(size, image.width, image.height)
+            variant = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            variants[name] = buffer.getvalue()
+        return variants
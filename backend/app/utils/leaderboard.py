@@ -0,0 +1,335 @@
+import asyncio
+import os
+import secrets
+import time
+from bisect import bisect_left, bisect_right, insort
+from ..models.profile import LEADERBOARD_PROJECTION
+from .serialization import leaderboard_entry
+
+def ranking_key(elo_rating, profile_id):
+    """Sort key giving (elo_rating desc, _id desc) order in an ascending list"""
+    return (-elo_rating, -int(str(profile_id), 16), str(profile_id))
+
+# Segment kinds and the filter each corresponds to in MongoDB
+SEGMENT_FIELDS = {
+    "club": "clubs.id",
+    "major": "education.major",
+    "year": "education.graduation_year",
+}
+
+def parse_segment(club=None, major=None, year=None):
+    """
+    The segment selected by leaderboard query parameters.
+
+    Returns:
+        (kind, value) tuple, or None for the global leaderboard
+
+    Raises:
+        ValueError: If more than one segment is given
+    """
+    chosen = [(kind, value) for kind, value in (("club", club), ("major", major), ("year", year)) if value is not None]
+    if len(chosen) > 1:
+        raise ValueError("Choose at most one of club, major and year")
+    return chosen[0] if chosen else None
+
+def segment_filter(segment):
+    """MongoDB filter selecting a segment's members"""
+    if segment is None:
+        return {}
+    kind, value = segment
+    return {SEGMENT_FIELDS[kind]: value}
+
+def entry_segments(entry):
+    """The (kind, value) segments a leaderboard entry belongs to"""
+    segments = {("club", club["id"]) for club in entry.get("clubs") or [] if club.get("id")}
+    education = entry.get("education") or {}
+    if education.get("major"):
+        segments.add(("major", education["major"]))
+    if education.get("graduation_year"):
+        segments.add(("year", education["graduation_year"]))
+    return segments
+
+class LeaderboardCache:
+    """
+    Process-local copy of the leaderboard, kept sorted with bisect.
+
+    Ratings changed by this worker are applied in place; changes made by
+    other workers arrive through a periodic sync that reads every
+    profile's version and re-reads only the profiles whose version moved.
+    Reads are only served while the last sync is younger than
+    `max_staleness` seconds, otherwise callers fall back to MongoDB.
+
+    Alongside the global ranking it keeps one sorted key list per segment
+    (club, major, graduation year) that shares the same key tuples, so a
+    segment's top N or a rank within it is a bisect away.
+    """
+
+    def __init__(self, max_staleness=60):
+        self.max_staleness = max_staleness
+        self._keys = []      # sorted ranking keys
+        self._entries = {}   # profile id -> leaderboard entry dict
+        self._segments = {}  # (kind, value) -> sorted ranking keys of its members
+        self._versions = {}  # profile id -> version of the document its entry was built from
+        self.synced_at = None
+        # Bumped whenever the contents change; the instance id keeps
+        # generations from different workers apart
+        self.generation = 0
+        self._instance = secrets.token_hex(4)
+        self.hits = 0
+        self.misses = 0
+        self.last_rebuild_seconds = None
+        self.last_sync_seconds = None
+        self.last_sync_changed = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def is_fresh(self):
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= self.max_staleness
+
+    def _serve(self):
+        # Count the read and report whether the cache can answer it
+        if self.is_fresh():
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def etag(self):
+        """ETag for the current contents, or None if the cache is too stale to serve"""
+        if not self.is_fresh():
+            return None
+        return f'"lb-{self._instance}-{self.generation}"'
+
+    def _ranking(self, segment):
+        if segment is None:
+            return self._keys
+        return self._segments.get(segment, [])
+
+    def page(self, limit, after=None, segment=None):
+        """
+        Return up to `limit` entries following `after`.
+
+        Args:
+            limit: Maximum number of entries
+            after: Optional (elo_rating, ObjectId) of the last row already seen
+            segment: Optional (kind, value) segment to rank within
+
+        Returns:
+            List of leaderboard entries, or None if the cache is too stale
+        """
+        if not self._serve():
+            return None
+
+        keys = self._ranking(segment)
+        start = 0
+        if after is not None:
+            start = bisect_right(keys, ranking_key(*after))
+
+        return [self._entries[key[2]] for key in keys[start:start + limit]]
+
+    def top(self, limit):
+        """The first `limit` entries regardless of staleness, without counting a read"""
+        return [self._entries[key[2]] for key in self._keys[:limit]]
+
+    def rank(self, profile_id, segment=None):
+        """
+        Look up where a profile sits on the leaderboard or within a segment.
+
+        Returns:
+            Tuple of (1-based rank, elo_rating, total ranked), or None if the
+            cache cannot answer or the profile is not in the segment
+        """
+        entry = self._entries.get(profile_id)
+        if entry is None or (segment is not None and segment not in entry_segments(entry)):
+            return None
+        if not self._serve():
+            return None
+        keys = self._ranking(segment)
+        key = ranking_key(entry["elo_rating"], profile_id)
+        return bisect_left(keys, key) + 1, entry["elo_rating"], len(keys)
+
+    def segment_sizes(self):
+        """Number of profiles in each segment"""
+        return {segment: len(keys) for segment, keys in self._segments.items()}
+
+    def _insert(self, entry):
+        self.generation += 1
+        self._entries[entry["_id"]] = entry
+        key = ranking_key(entry["elo_rating"], entry["_id"])
+        insort(self._keys, key)
+        for segment in entry_segments(entry):
+            insort(self._segments.setdefault(segment, []), key)
+
+    def _remove(self, profile_id):
+        self._versions.pop(profile_id, None)
+        entry = self._entries.pop(profile_id, None)
+        if entry is None:
+            return None
+        self.generation += 1
+        key = ranking_key(entry["elo_rating"], profile_id)
+        del self._keys[bisect_left(self._keys, key)]
+        for segment in entry_segments(entry):
+            keys = self._segments[segment]
+            del keys[bisect_left(keys, key)]
+            if not keys:
+                del self._segments[segment]
+        return entry
+
+    def update_rating(self, profile_id, elo_rating, match_count):
+        """Move a profile after a vote changed its rating"""
+        entry = self._remove(profile_id)
+        if entry is None:
+            # Not seen yet; the next sync will pick it up
+            return
+        entry = dict(entry, elo_rating=elo_rating, match_count=match_count)
+        self._insert(entry)
+
+    def shift_rating(self, profile_id, rating_delta, matches=1):
+        """Apply a rating change known only as a delta, such as a summed batch of votes"""
+        entry = self._entries.get(profile_id)
+        if entry is None:
+            return
+        self.update_rating(profile_id, entry["elo_rating"] + rating_delta, entry["match_count"] + matches)
+
+    def upsert(self, profile):
+        """Insert or replace a profile from a (possibly unprojected) document"""
+        entry = self._make_entry(profile)
+        self._remove(entry["_id"])
+        self._insert(entry)
+        # Without a version the next sync re-reads the profile, which is harmless
+        if "version" in profile:
+            self._versions[entry["_id"]] = profile["version"]
+
+    def remove(self, profile_id):
+        self._remove(profile_id)
+
+    @staticmethod
+    def _make_entry(profile):
+        return leaderboard_entry(profile)
+
+    @classmethod
+    def _build(cls, profiles, previous):
+        # Runs in a worker thread; touches nothing but its arguments
+        entries = {}
+        versions = {}
+        keys = []
+        segments = {}
+        for profile in profiles:
+            entry = cls._make_entry(profile)
+            entries[entry["_id"]] = entry
+            versions[entry["_id"]] = profile.get("version")
+            key = ranking_key(entry["elo_rating"], entry["_id"])
+            keys.append(key)
+            for segment in entry_segments(entry):
+                segments.setdefault(segment, []).append(key)
+
+        keys.sort()
+        for segment_keys in segments.values():
+            segment_keys.sort()
+        return entries, versions, keys, segments, entries != previous
+
+    async def rebuild(self, collection):
+        """
+        Reload every profile and every segment from MongoDB.
+
+        Only the fetch runs on the event loop. Validating every profile and
+        sorting the rankings takes seconds on a large collection, so that
+        happens in a worker thread and requests keep being served meanwhile.
+        """
+        start = time.perf_counter()
+        profiles = await collection.find({}, {**LEADERBOARD_PROJECTION, "version": 1}).to_list(length=None)
+        # Entry dicts are replaced, never mutated, so a shallow copy is a stable snapshot
+        previous = dict(self._entries)
+        entries, versions, keys, segments, changed = await asyncio.get_running_loop().run_in_executor(
+            None, self._build, profiles, previous
+        )
+
+        # A resync that finds nothing new keeps existing ETags valid
+        if changed:
+            self.generation += 1
+        self._entries = entries
+        self._versions = versions
+        self._keys = keys
+        self._segments = segments
+        self.synced_at = time.monotonic()
+        self.last_rebuild_seconds = time.perf_counter() - start
+
+    async def sync(self, collection, batch_size=200):
+        """
+        Catch up with changes made by other workers.
+
+        Every write to a profile bumps its version, so only `_id` and
+        `version` are read for the whole collection, and full documents
+        only for profiles that are new or whose version differs from the
+        one their entry was built from. Profiles that disappeared are
+        dropped. When most of the collection changed, a full rebuild is
+        cheaper than moving entries one at a time.
+
+        Returns:
+            Number of profiles added, changed or removed
+        """
+        if self.synced_at is None:
+            await self.rebuild(collection)
+            return len(self._entries)
+
+        start = time.perf_counter()
+        # Profiles added here while the scan runs are not missing from MongoDB
+        known = list(self._entries)
+        seen = set()
+        changed = []
+        async for doc in collection.find({}, {"version": 1}).batch_size(10000):
+            profile_id = str(doc["_id"])
+            seen.add(profile_id)
+            if profile_id not in self._entries or self._versions.get(profile_id) != doc.get("version"):
+                changed.append(doc["_id"])
+        removed = [profile_id for profile_id in known if profile_id not in seen]
+
+        if len(changed) > max(len(self._entries) // 10, batch_size):
+            await self.rebuild(collection)
+            return len(changed) + len(removed)
+
+        for offset in range(0, len(changed), batch_size):
+            async for profile in collection.find(
+                {"_id": {"$in": changed[offset:offset + batch_size]}},
+                {**LEADERBOARD_PROJECTION, "version": 1}
+            ):
+                self.upsert(profile)
+            # Moving an entry shifts the sorted lists; let requests in between batches
+            await asyncio.sleep(0)
+        for profile_id in removed:
+            self._remove(profile_id)
+
+        self.synced_at = time.monotonic()
+        self.last_sync_seconds = time.perf_counter() - start
+        self.last_sync_changed = len(changed) + len(removed)
+        return self.last_sync_changed
+
+    async def resync_forever(self, collection, interval):
+        """Periodically sync so ratings changed by other workers converge"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync(collection)
+            except Exception as e:
+                print(f"Leaderboard cache resync failed: {e}")
+
+    def stats(self):
+        reads = self.hits + self.misses
+        return {
+            "size": len(self._keys),
+            "segments": len(self._segments),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / reads if reads else None,
+            "last_rebuild_seconds": self.last_rebuild_seconds,
+            "last_sync_seconds": self.last_sync_seconds,
+            "last_sync_changed": self.last_sync_changed,
+            "age_seconds": time.monotonic() - self.synced_at if self.synced_at is not None else None,
+            "max_staleness_seconds": self.max_staleness,
+            "generation": self.generation,
+        }
+
+leaderboard_cache = LeaderboardCache(
+    max_staleness=float(os.environ.get("LEADERBOARD_MAX_STALENESS_SECONDS", "60"))
+)
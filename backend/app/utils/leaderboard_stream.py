@@ -0,0 +1,273 @@
+import asyncio
+import os
+import time
+from collections import deque
+import orjson
+from .leaderboard import leaderboard_cache
+from .serialization import _default
+
+# Entries at the top of the leaderboard that the stream follows
+LEADERBOARD_STREAM_SIZE = int(os.environ.get("LEADERBOARD_STREAM_SIZE", "100"))
+# Changes within this window go out as one delta
+LEADERBOARD_STREAM_WINDOW_SECONDS = float(os.environ.get("LEADERBOARD_STREAM_WINDOW_SECONDS", "0.25"))
+LEADERBOARD_STREAM_HEARTBEAT_SECONDS = float(os.environ.get("LEADERBOARD_STREAM_HEARTBEAT_SECONDS", "15"))
+# Events buffered for one subscriber before it is treated as too slow
+LEADERBOARD_STREAM_QUEUE_SIZE = int(os.environ.get("LEADERBOARD_STREAM_QUEUE_SIZE", "64"))
+LEADERBOARD_STREAM_MAX_SUBSCRIBERS = int(os.environ.get("LEADERBOARD_STREAM_MAX_SUBSCRIBERS", "10000"))
+
+# Fields a vote changes; anything else changing resends the whole entry
+RATING_FIELDS = ("elo_rating", "match_count")
+
+_HEARTBEAT = b": ping\n\n"
+_RESYNC = object()
+_CLOSE = object()
+
+def sse_event(event, data, event_id=None):
+    """Encode one Server-Sent Event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}\n".encode())
+    lines.append(f"event: {event}\n".encode())
+    lines.append(b"data: " + orjson.dumps(data, default=_default) + b"\n\n")
+    return b"".join(lines)
+
+def leaderboard_diff(previous, current):
+    """
+    Changes between two top-N lists of leaderboard entries.
+
+    Entries that moved or were re-rated are sent as just their id, rank
+    and rating fields; entries that are new to the list, or whose other
+    fields changed, are sent in full.
+
+    Returns:
+        Tuple of (changed entries with "rank", ids that left the list)
+    """
+    before = {entry["_id"]: (rank, entry) for rank, entry in enumerate(previous, 1)}
+    changed = []
+    for rank, entry in enumerate(current, 1):
+        old = before.pop(entry["_id"], None)
+        if old is None:
+            changed.append(dict(entry, rank=rank))
+            continue
+        old_rank, old_entry = old
+        if old_entry is entry:
+            if old_rank != rank:
+                changed.append({"_id": entry["_id"], "rank": rank})
+            continue
+        if any(entry.get(field) != old_entry.get(field) for field in entry if field not in RATING_FIELDS):
+            changed.append(dict(entry, rank=rank))
+        elif old_rank != rank or any(entry.get(field) != old_entry.get(field) for field in RATING_FIELDS):
+            changed.append({"_id": entry["_id"], "rank": rank, **{field: entry.get(field) for field in RATING_FIELDS}})
+    return changed, list(before)
+
+class LatencySamples:
+    """Most recent latency samples, summarized as percentiles"""
+
+    def __init__(self, size=1024):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def summary(self):
+        if not self._samples:
+            return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+        ordered = sorted(self._samples)
+        return {
+            "p50_ms": ordered[len(ordered) // 2] * 1000,
+            "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+
+class Subscriber:
+    """One stream connection and its bounded queue of encoded events"""
+
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.connected_at = time.monotonic()
+        self.snapshot_seq = 0
+
+    def offer(self, item):
+        """
+        Queue an item without waiting.
+
+        A subscriber whose queue is full has fallen behind: what it has
+        queued is discarded and it is sent a fresh snapshot instead.
+
+        Returns:
+            True if the item was queued, False if the subscriber was reset
+        """
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_RESYNC)
+            return False
+
+class LeaderboardStream:
+    """
+    Fans leaderboard changes out to Server-Sent Event subscribers.
+
+    A single task watches the leaderboard cache's generation every
+    `window` seconds. When it moved, the top `size` entries are diffed
+    against the last published list once, the delta is encoded once, and
+    the same bytes are queued for every subscriber; coalescing a window of
+    votes into one delta keeps the cost per subscriber to a queue put.
+    Votes applied by other workers arrive through the cache's periodic
+    rebuild, like everything else the cache serves.
+    """
+
+    def __init__(self, size, window, heartbeat, queue_size, max_subscribers):
+        self.size = size
+        self.window = window
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._top = []
+        self._generation = None
+        self._snapshot = None   # encoded snapshot of _top, built when first needed
+        self.seq = 0
+        self._task = None
+        self.connections = 0
+        self.rejected = 0
+        self.resyncs = 0
+        self.events = 0
+        self.fanout_latency = LatencySamples()
+        self.delivery_latency = LatencySamples()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def _refresh(self):
+        """Diff the cache's current top entries against the published ones and queue the delta"""
+        generation = leaderboard_cache.generation
+        if generation == self._generation:
+            return
+        self._generation = generation
+        current = leaderboard_cache.top(self.size)
+        changed, removed = leaderboard_diff(self._top, current)
+        self._top = current
+        if not changed and not removed:
+            return
+
+        start = time.perf_counter()
+        self.seq += 1
+        self._snapshot = None
+        event = sse_event("delta", {"seq": self.seq, "changed": changed, "removed": removed}, self.seq)
+        published_at = time.monotonic()
+        for subscriber in list(self._subscribers):
+            if not subscriber.offer((published_at, self.seq, event)):
+                self.resyncs += 1
+        self.events += 1
+        self.fanout_latency.add(time.perf_counter() - start)
+
+    def snapshot_event(self):
+        """The encoded top list as of the last published delta, shared by every reader"""
+        if self._snapshot is None:
+            entries = [dict(entry, rank=rank) for rank, entry in enumerate(self._top, 1)]
+            self._snapshot = sse_event("snapshot", {"seq": self.seq, "entries": entries}, self.seq)
+        return self._snapshot
+
+    def subscribe(self):
+        """
+        Register a new subscriber.
+
+        Returns:
+            Tuple of (subscriber, encoded snapshot to send first)
+
+        Raises:
+            OverflowError: If the stream already has `max_subscribers`
+        """
+        if len(self._subscribers) >= self.max_subscribers:
+            self.rejected += 1
+            raise OverflowError("Too many leaderboard stream subscribers")
+        # Catch up first so the snapshot and the deltas that follow line up
+        self._refresh()
+        subscriber = Subscriber(self.queue_size)
+        subscriber.snapshot_seq = self.seq
+        self._subscribers.add(subscriber)
+        self.connections += 1
+        return subscriber, self.snapshot_event()
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    async def events_for(self, subscriber, snapshot):
+        """Yield the encoded events for one subscriber until it disconnects or the stream closes"""
+        try:
+            yield snapshot
+            # Deltas already folded into the last snapshot sent are skipped
+            sent_seq = subscriber.snapshot_seq
+            while True:
+                item = await subscriber.queue.get()
+                if item is _CLOSE:
+                    return
+                if item is _RESYNC:
+                    sent_seq = self.seq
+                    yield self.snapshot_event()
+                    continue
+                published_at, seq, event = item
+                if seq is not None:
+                    if seq <= sent_seq:
+                        continue
+                    sent_seq = seq
+                    self.delivery_latency.add(time.monotonic() - published_at)
+                yield event
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def run_forever(self):
+        """Publish coalesced deltas every window and heartbeats to keep idle connections open"""
+        last_heartbeat = time.monotonic()
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                if not self._subscribers:
+                    # Nobody to tell; the next subscriber catches up on subscribe
+                    continue
+                self._refresh()
+                if time.monotonic() - last_heartbeat >= self.heartbeat:
+                    last_heartbeat = time.monotonic()
+                    for subscriber in list(self._subscribers):
+                        subscriber.offer((None, None, _HEARTBEAT))
+            except Exception as e:
+                print(f"Leaderboard stream publish failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    def stop(self):
+        """Stop publishing and end every open stream"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for subscriber in list(self._subscribers):
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(_CLOSE)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "connections": self.connections,
+            "rejected": self.rejected,
+            "resyncs": self.resyncs,
+            "events": self.events,
+            "seq": self.seq,
+            "size": self.size,
+            "window_seconds": self.window,
+            "fanout": self.fanout_latency.summary(),
+            "delivery": self.delivery_latency.summary(),
+        }
+
+leaderboard_stream = LeaderboardStream(
+    size=LEADERBOARD_STREAM_SIZE,
+    window=LEADERBOARD_STREAM_WINDOW_SECONDS,
+    heartbeat=LEADERBOARD_STREAM_HEARTBEAT_SECONDS,
+    queue_size=LEADERBOARD_STREAM_QUEUE_SIZE,
+    max_subscribers=LEADERBOARD_STREAM_MAX_SUBSCRIBERS,
+)
@@ -0,0 +1,32 @@
+async def sample_profile_pair(collection, projection=None, max_attempts=5):
+    """
+    Pick two distinct random profiles without scanning the collection.
+
+    Uses a server-side $sample stage, which MongoDB serves from a random
+    cursor once the collection is large enough, so the cost does not grow
+    with the number of profiles. The random cursor may hand back the same
+    document twice, in which case the sample is retried.
+
+    Args:
+        collection: Motor collection to sample from
+        projection: Optional projection applied to the sampled documents
+        max_attempts: How many times to retry when a duplicate is sampled
+
+    Returns:
+        List of up to two distinct profile documents
+    """
+    pipeline = [{"$sample": {"size": 2}}]
+    if projection:
+        pipeline.append({"$project": projection})
+
+    profiles = []
+    for _ in range(max_attempts):
+        profiles = await collection.aggregate(pipeline).to_list(length=2)
+        if len(profiles) < 2 or profiles[0]["_id"] != profiles[1]["_id"]:
+            break
+
+    # Collapse a duplicate that survived every attempt
+    if len(profiles) == 2 and profiles[0]["_id"] == profiles[1]["_id"]:
+        profiles = profiles[:1]
+
+    return profiles
@@ -0,0 +1,194 @@
+import os
+import secrets
+from datetime import datetime, timedelta
+from bson import ObjectId
+from jose import jwt
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .auth import SECRET_KEY, ALGORITHM
+from .rating_engines import rating_engine
+from .votes import rating_increment, match_record, apply_vote, RatingConflict
+
+MATCHUP_TOKEN_SECRET = os.environ.get("MATCHUP_TOKEN_SECRET", SECRET_KEY)
+# Votes must arrive within this long of the matchup being served
+MATCHUP_TOKEN_TTL_SECONDS = int(os.environ.get("MATCHUP_TOKEN_TTL_SECONDS", "900"))
+MAX_MATCHUPS = int(os.environ.get("MAX_MATCHUPS", "20"))
+MAX_VOTE_BATCH = int(os.environ.get("MAX_VOTE_BATCH", "100"))
+
+VALID_RESULTS = (0, 0.5, 1)
+
+def issue_matchup_token(profile, opponent):
+    """
+    Sign a matchup between two profile documents.
+
+    The token carries both ids and the rating state each profile had when
+    the matchup was served, plus a unique id so it can only be voted on once.
+    """
+    claims = {
+        "jti": secrets.token_urlsafe(12),
+        "p": [str(profile["_id"]), str(opponent["_id"])],
+        "s": [rating_engine.state_from_profile(profile), rating_engine.state_from_profile(opponent)],
+        "exp": datetime.utcnow() + timedelta(seconds=MATCHUP_TOKEN_TTL_SECONDS),
+    }
+    return jwt.encode(claims, MATCHUP_TOKEN_SECRET, algorithm=ALGORITHM)
+
+def read_matchup_token(token):
+    """
+    Verify a matchup token and return its claims.
+
+    Raises:
+        ValueError: If the token is malformed, forged or expired
+    """
+    try:
+        claims = jwt.decode(token, MATCHUP_TOKEN_SECRET, algorithms=[ALGORITHM])
+        profile_id, opponent_id = claims["p"]
+        claims["oids"] = (ObjectId(profile_id), ObjectId(opponent_id))
+        # Snapshots from before a rating engine change cannot be rated
+        profile_state, opponent_state = claims["s"]
+        if not all(field in profile_state and field in opponent_state for field in rating_engine.fields):
+            raise ValueError()
+    except jwt.ExpiredSignatureError:
+        raise ValueError("Matchup token expired")
+    except Exception:
+        raise ValueError("Invalid matchup token")
+    return claims
+
+def _replay(votes, skip=()):
+    """
+    Rate votes in order, carrying each profile's state from vote to vote.
+
+    A profile starts from the snapshot in the first token that names it,
+    so several votes on one profile build on each other instead of all
+    being rated against the same snapshot.
+
+    Returns:
+        Tuple of (state each profile started from, state it ended with,
+        and per vote ((profile before, after), (opponent before, after)),
+        or None where skipped)
+    """
+    initial = {}
+    states = {}
+    sides = []
+    for index, (claims, result) in enumerate(votes):
+        if index in skip:
+            sides.append(None)
+            continue
+        profile_oid, opponent_oid = claims["oids"]
+        for oid, snapshot in zip(claims["oids"], claims["s"]):
+            if oid not in states:
+                initial[oid] = states[oid] = snapshot
+        profile_state, opponent_state = states[profile_oid], states[opponent_oid]
+        new_profile_state, new_opponent_state = rating_engine.rate(profile_state, opponent_state, result)
+        states[profile_oid], states[opponent_oid] = new_profile_state, new_opponent_state
+        sides.append(((profile_state, new_profile_state), (opponent_state, new_opponent_state)))
+    return initial, states, sides
+
+def _ratings(sides):
+    # ratings_before / ratings_after of a match record
+    (before, after), (opponent_before, opponent_after) = sides
+    return {
+        "ratings_before": [before["elo_rating"], opponent_before["elo_rating"]],
+        "ratings_after": [after["elo_rating"], opponent_after["elo_rating"]],
+    }
+
+async def apply_matchup_votes(profiles_collection, matches_collection, votes):
+    """
+    Apply token-backed votes in the order given.
+
+    Every match is logged first with its token id; the unique token_id
+    index turns a replayed token into a duplicate that is skipped. Then:
+
+    - ELO: the votes are replayed from the token snapshots with each
+      profile's state carried forward, and the net change per profile is
+      written as server-side increments in one bulk_write, with no reads.
+      If the rating update fails after the log insert, rebuild_ratings
+      recovers it from the log.
+    - Engines whose changes are not additive (Glicko-2): each vote goes
+      through apply_vote, which rates the profiles' current state and
+      writes it with a compare-and-set, one vote after another. A vote
+      that keeps conflicting has its log entry removed so its token can be
+      sent again.
+
+    Args:
+        votes: List of (claims from read_matchup_token, result) tuples
+
+    Returns:
+        Tuple of (dict of profile id -> (rating change, matches played),
+        number of duplicates, indexes into `votes` that conflicted)
+    """
+    if not votes:
+        return {}, 0, []
+
+    initial, states, sides = _replay(votes)
+    records = []
+    for (claims, result), vote_sides in zip(votes, sides):
+        profile_oid, opponent_oid = claims["oids"]
+        record = match_record(profile_oid, opponent_oid, result, [], [])
+        record.update(_ratings(vote_sides))
+        record["token_id"] = claims["jti"]
+        records.append(record)
+
+    duplicates = set()
+    try:
+        await matches_collection.insert_many(records, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        duplicates = {error["index"] for error in errors}
+
+    applied = {}
+    conflicts = []
+
+    if rating_engine.additive:
+        if duplicates:
+            # Rated as if every vote applied; replay without the duplicates
+            # and correct the log entries that came out differently
+            initial, states, replayed = _replay(votes, duplicates)
+            fixes = [
+                UpdateOne({"_id": records[index]["_id"]}, {"$set": _ratings(vote_sides)})
+                for index, vote_sides in enumerate(replayed)
+                if vote_sides is not None and vote_sides != sides[index]
+            ]
+            if fixes:
+                await matches_collection.bulk_write(fixes, ordered=False)
+
+        matches = {}
+        for index, (claims, _) in enumerate(votes):
+            if index not in duplicates:
+                for oid in claims["oids"]:
+                    matches[oid] = matches.get(oid, 0) + 1
+        if matches:
+            await profiles_collection.bulk_write(
+                [
+                    rating_increment(oid, rating_engine.changes(initial[oid], states[oid]), matches[oid])
+                    for oid in matches
+                ],
+                ordered=False
+            )
+        for oid in matches:
+            applied[str(oid)] = (states[oid]["elo_rating"] - initial[oid]["elo_rating"], matches[oid])
+        return applied, len(duplicates), conflicts
+
+    fixes = []
+    for index, (claims, result) in enumerate(votes):
+        if index in duplicates:
+            continue
+        profile_oid, opponent_oid = claims["oids"]
+        try:
+            # apply_vote reads the current state itself
+            vote_sides = await apply_vote(profiles_collection, {"_id": profile_oid}, {"_id": opponent_oid}, result)
+        except RatingConflict as e:
+            print(f"Batched vote {claims['jti']} not applied: {e}")
+            await matches_collection.delete_one({"_id": records[index]["_id"]})
+            conflicts.append(index)
+            continue
+        fixes.append(UpdateOne({"_id": records[index]["_id"]}, {"$set": _ratings(vote_sides)}))
+        for oid, (before, after) in zip(claims["oids"], vote_sides):
+            rating_delta, matches = applied.get(str(oid), (0, 0))
+            applied[str(oid)] = (rating_delta + after["elo_rating"] - before["elo_rating"], matches + 1)
+
+    # Log what was actually applied rather than the snapshot replay
+    if fixes:
+        await matches_collection.bulk_write(fixes, ordered=False)
+    return applied, len(duplicates), conflicts
@@ -0,0 +1,276 @@
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Set to "false" to leave out the request middleware, command listener and /metrics
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, shared by request and database timings
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """
+    A named metric with one series per combination of label values.
+
+    Label values are passed positionally in `labelnames` order. Updates
+    take a lock because driver events arrive on the driver's threads.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        with self._lock:
+            series = list(self._series.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in series]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._series[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+class CallbackMetric(Metric):
+    """
+    Gauge or counter read from application state when scraped.
+
+    `function` returns a number, or a dict of label value tuples to numbers
+    when the metric has labels. Nothing is recorded between scrapes, so
+    exposing a counter the application already keeps costs nothing.
+    """
+
+    def __init__(self, name, documentation, function, labelnames=(), kind="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self.kind = kind
+
+    def samples(self):
+        value = self.function()
+        series = value.items() if isinstance(value, dict) else [((), value)]
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(number)}"
+            for labels, number in series if number is not None
+        ]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        # Counts are kept per bucket and made cumulative when scraped
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = []
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Registry:
+    """Metrics exposed on /metrics, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def callback_gauge(self, name, documentation, function, labelnames=()):
+        return self.register(CallbackMetric(name, documentation, function, labelnames))
+
+    def callback_counter(self, name, documentation, function, labelnames=()):
+        return self.register(CallbackMetric(name, documentation, function, labelnames, kind="counter"))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Could not collect metric {metric.name}: {e}")
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Time to complete an HTTP request, by route template",
+    ("method", "route", "status")
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled", ("method",)
+)
+mongodb_command_seconds = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trip time", ("collection", "command")
+)
+mongodb_command_failures = registry.counter(
+    "mongodb_command_failures_total", "MongoDB commands that returned an error", ("collection", "command")
+)
+event_loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a sleeping task",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+_route_templates = {}  # id of a route -> its full path template; routes live as long as the app
+
+def route_template(scope):
+    """
+    The route template a handled request matched, such as /api/profiles/{profile_id}.
+
+    The route's own path may leave out the prefix of the router it was
+    included with, so the prefix is taken from the request path: whatever
+    comes before as many segments as the route's path has.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = _route_templates.get(id(route))
+    if template is None:
+        prefix = scope["path"].rsplit("/", route.path.count("/"))[0]
+        template = _route_templates[id(route)] = prefix + route.path
+    return template
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request.
+
+    Requests are labelled by the template of the route that handled them,
+    so ids never become label values. Streaming responses are timed until
+    the stream ends.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec(method)
+            http_request_seconds.observe(time.perf_counter() - start, method, route_template(scope), status)
+
+class EventLoopMonitor:
+    """
+    Measures event loop lag by sleeping for a fixed interval and recording
+    how much later than asked the loop resumed; anything blocking the loop
+    (CPU-bound handlers, synchronous I/O) shows up here.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    async def run_forever(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - start - self.interval, 0.0)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            event_loop_lag_seconds.observe(lag)
+
+event_loop_monitor = EventLoopMonitor(EVENT_LOOP_LAG_INTERVAL_SECONDS)
+
+registry.callback_gauge(
+    "event_loop_lag_last_seconds", "Event loop lag at the last measurement", lambda: event_loop_monitor.last_lag
+)
+
+def install_metrics(app):
+    """
+    Time every request to `app` when metrics are enabled.
+
+    Added last, so it wraps compression and CORS and times the whole
+    response.
+    """
+    if METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import secrets
+import time
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from .search import search_terms
+
+RUN_MIGRATIONS_ON_STARTUP = os.environ.get("RUN_MIGRATIONS_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# A running migration whose claim has not been renewed for this long is taken to have died
+MIGRATION_LEASE_SECONDS = float(os.environ.get("MIGRATION_LEASE_SECONDS", "300"))
+
+# Indexes the API depends on, as (collection, keys, options)
+INDEXES = [
+    # Registration, login and principal lookup; also enforces one account per email
+    ("profiles", [("email", 1)], {"name": "email_unique", "unique": True}),
+    # Leaderboard order, rank counting and keyset pagination
+    ("profiles", [("elo_rating", -1), ("_id", -1)], {"name": "elo_rating_id"}),
+    # Search: each filter field followed by the ranking order, so matches come back ranked
+    ("profiles", [("search_terms", 1), ("elo_rating", -1), ("_id", -1)], {"name": "search_terms_rating"}),
+    ("profiles", [("clubs.id", 1), ("elo_rating", -1), ("_id", -1)], {"name": "club_rating"}),
+    ("profiles", [("education.major", 1), ("elo_rating", -1), ("_id", -1)], {"name": "major_rating"}),
+    ("profiles", [("education.graduation_year", 1), ("elo_rating", -1), ("_id", -1)],
+     {"name": "graduation_year_rating"}),
+    # Chronological replay of the match log
+    ("matches", [("played_at", 1), ("_id", 1)], {"name": "played_at_id"}),
+    # One vote per matchup token; votes cast without a token carry no token_id
+    ("matches", [("token_id", 1)],
+     {"name": "token_id_unique", "unique": True, "partialFilterExpression": {"token_id": {"$exists": True}}}),
+    # Email outbox: claiming due messages, expiring sent mail
+    ("email_outbox", [("status", 1), ("next_attempt_at", 1)], {"name": "status_next_attempt"}),
+    ("email_outbox", [("sent_at", 1)], {"name": "sent_at_ttl", "expireAfterSeconds": 7 * 24 * 3600}),
+    # Rate limit counters go once their window has closed
+    ("email_rate_limits", [("expires_at", 1)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+]
+
+# Indexes created by earlier releases that the ones above replace. A
+# replacement cannot share its keys with the index it retires: both exist
+# until the replacement is built.
+RETIRED_INDEXES = []
+
+async def backfill_rating_fields(database):
+    """Give profiles created before ratings existed the default rating fields"""
+    profiles = database.profiles
+    missing_rating = await profiles.update_many(
+        {"elo_rating": {"$exists": False}},
+        {"$set": {"elo_rating": 1500}}
+    )
+    missing_count = await profiles.update_many(
+        {"match_count": {"$exists": False}},
+        {"$set": {"match_count": 0}}
+    )
+    return {"modified": missing_rating.modified_count + missing_count.modified_count}
+
+async def backfill_search_terms(database, batch_size=1000):
+    """Give profiles created before search existed their search terms"""
+    profiles = database.profiles
+    modified = 0
+    operations = []
+    async for profile in profiles.find({"search_terms": {"$exists": False}}, {"name": 1, "experiences": 1}):
+        operations.append(UpdateOne({"_id": profile["_id"]}, {"$set": {"search_terms": search_terms(profile)}}))
+        if len(operations) >= batch_size:
+            modified += (await profiles.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    if operations:
+        modified += (await profiles.bulk_write(operations, ordered=False)).modified_count
+    return {"modified": modified}
+
+# Versioned migrations, applied in order. Each must be safe to run again.
+MIGRATIONS = [
+    (1, "backfill_rating_fields", backfill_rating_fields),
+    (2, "backfill_search_terms", backfill_search_terms),
+]
+
+async def ensure_indexes(database):
+    """
+    Create every declared index, then drop retired ones.
+
+    create_index is a no-op for indexes that already exist, so this is cheap
+    on every startup. A failure on one index (for example duplicate emails
+    blocking the unique index) is reported without stopping the rest, and
+    keeps the retired indexes in place.
+
+    Returns:
+        List of per-index reports with name, seconds and any error
+    """
+    reports = []
+    for collection_name, keys, options in INDEXES:
+        start = time.perf_counter()
+        error = None
+        try:
+            await database[collection_name].create_index(keys, **options)
+        except OperationFailure as e:
+            error = str(e)
+            print(f"Could not create index {collection_name}.{options['name']}: {e}")
+        reports.append({
+            "collection": collection_name,
+            "name": options["name"],
+            "seconds": time.perf_counter() - start,
+            "error": error,
+        })
+
+    # Retired indexes go only once their replacements are built, so a failed
+    # build (say, duplicates blocking a unique index) leaves the old one serving
+    if any(report["error"] for report in reports):
+        if RETIRED_INDEXES:
+            print("Keeping retired indexes until every declared index is built")
+        return reports
+    for collection_name, index_name in RETIRED_INDEXES:
+        existing = await database[collection_name].index_information()
+        if index_name in existing:
+            await database[collection_name].drop_index(index_name)
+            print(f"Dropped retired index {collection_name}.{index_name}")
+
+    return reports
+
+async def claim_migration(applied, version, name, claim):
+    """
+    Claim a migration for this worker.
+
+    The claim is a `running` record with a lease that its holder renews
+    while the migration runs. A record whose lease has lapsed belongs to a
+    worker that died mid-migration, so it is taken over.
+
+    Returns:
+        True if this worker now holds the claim
+    """
+    now = datetime.utcnow()
+    try:
+        await applied.insert_one({
+            "_id": version,
+            "name": name,
+            "status": "running",
+            "claim": claim,
+            "started_at": now,
+            "claimed_at": now,
+        })
+        return True
+    except DuplicateKeyError:
+        pass
+
+    # Already applied, being applied by another worker, or abandoned
+    expired = now - timedelta(seconds=MIGRATION_LEASE_SECONDS)
+    abandoned = await applied.find_one_and_update(
+        {
+            "_id": version,
+            "status": "running",
+            "$or": [
+                {"claimed_at": {"$lt": expired}},
+                # Claims made before leases existed only carry started_at
+                {"claimed_at": {"$exists": False}, "started_at": {"$lt": expired}},
+            ],
+        },
+        {"$set": {"claim": claim, "started_at": now, "claimed_at": now}}
+    )
+    if abandoned is None:
+        return False
+    print(f"Took over migration {version} ({name}) abandoned by an earlier claim")
+    return True
+
+async def renew_claim(applied, version, claim):
+    """Keep a claim's lease from lapsing while its migration runs"""
+    while True:
+        await asyncio.sleep(MIGRATION_LEASE_SECONDS / 3)
+        try:
+            await applied.update_one(
+                {"_id": version, "claim": claim},
+                {"$set": {"claimed_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            print(f"Could not renew the claim on migration {version}: {e}")
+
+async def run_migrations(database):
+    """
+    Apply every migration not yet recorded in `schema_migrations`.
+
+    A migration is claimed before it runs, so when several workers start
+    together only one of them applies it. Migrations run in order: a worker
+    stops at the first one another worker holds, and that worker carries on
+    through the rest. A failed migration releases its claim and is retried
+    on the next run; the claim of a worker that died mid-migration lapses
+    after `MIGRATION_LEASE_SECONDS` and is taken over.
+
+    Returns:
+        List of reports for the migrations applied by this call
+    """
+    applied = database.schema_migrations
+    reports = []
+
+    for version, name, migrate in MIGRATIONS:
+        claim = secrets.token_hex(8)
+        if not await claim_migration(applied, version, name, claim):
+            record = await applied.find_one({"_id": version}, {"status": 1})
+            if record is not None and record["status"] == "applied":
+                continue
+            # Later migrations may depend on this one
+            print(f"Migration {version} ({name}) is held by another worker; leaving the rest to it")
+            break
+
+        renewal = asyncio.create_task(renew_claim(applied, version, claim))
+        start = time.perf_counter()
+        try:
+            result = await migrate(database)
+        except Exception:
+            await applied.delete_one({"_id": version, "claim": claim})
+            raise
+        finally:
+            renewal.cancel()
+        seconds = time.perf_counter() - start
+
+        marked = await applied.update_one(
+            {"_id": version, "claim": claim},
+            {"$set": {"status": "applied", "applied_at": datetime.utcnow(), "seconds": seconds, "result": result},
+             "$unset": {"claim": "", "claimed_at": ""}}
+        )
+        if not marked.matched_count:
+            # Our lease lapsed and another worker took the migration over; it records it
+            print(f"Migration {version} ({name}) was taken over by another worker before it finished here")
+            break
+        print(f"Applied migration {version} ({name}) in {seconds:.3f}s: {result}")
+        reports.append({"version": version, "name": name, "seconds": seconds, "result": result})
+
+    return reports
+
+async def migration_status(database):
+    """Every declared migration with its recorded state, or None if pending"""
+    recorded = {doc["_id"]: doc async for doc in database.schema_migrations.find({})}
+    return [
+        {"version": version, "name": name, "state": recorded.get(version)}
+        for version, name, _ in MIGRATIONS
+    ]
+
+async def provision(database):
+    """Create indexes, then apply pending migrations"""
+    return {
+        "indexes": await ensure_indexes(database),
+        "migrations": await run_migrations(database),
+    }
@@ -0,0 +1,39 @@
+from bson import ObjectId
+
+def encode_cursor(elo_rating, profile_id):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    return f"{elo_rating}_{profile_id}"
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Returns:
+        Tuple of (elo_rating, ObjectId)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        elo_rating, profile_id = cursor.rsplit("_", 1)
+        return int(elo_rating), ObjectId(profile_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def keyset_filter(cursor):
+    """
+    Build a filter selecting rows after `cursor` in (elo_rating desc, _id desc) order.
+
+    The filter is answered from the elo_rating/_id compound index, so fetching
+    a page costs the same no matter how deep into the ranking it is.
+    """
+    elo_rating, profile_oid = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"elo_rating": {"$lt": elo_rating}},
+            {"elo_rating": elo_rating, "_id": {"$lt": profile_oid}},
+        ]
+    }
+
+# Sort order matching the elo_rating/_id compound index
+RANKING_SORT = [("elo_rating", -1), ("_id", -1)]
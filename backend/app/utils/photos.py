@@ -0,0 +1,130 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pymongo import ReturnDocument
+from .database import photos_bucket
+from .images import render_variants, VARIANT_CONTENT_TYPE
+
+# Public address the API is reached at; photo URLs are built from it when responses are rendered
+PHOTO_BASE_URL = os.environ.get("PHOTO_BASE_URL", "http://localhost:8000").rstrip("/")
+# Profiles store their photos by path, so moving the API does not break them
+PHOTO_PATH = "/api/photos/"
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+ALLOWED_CONTENT_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+PHOTO_WORKERS = int(os.environ.get("PHOTO_WORKERS", "2"))
+
+# Created on first use so importing the app does not fork workers
+_executor = None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PHOTO_WORKERS)
+    return _executor
+
+def shutdown_executor():
+    """Stop the image worker processes"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def decode_data_url(data_url):
+    """
+    Decode a base64 `data:image/...` URL.
+
+    Returns:
+        Tuple of (content type, image bytes)
+
+    Raises:
+        ValueError: If the URL is malformed, not an allowed image type, or too large
+    """
+    header, _, payload = data_url.partition(",")
+    if not header.startswith("data:") or not header.endswith(";base64"):
+        raise ValueError("Photo must be a base64 data URL")
+
+    content_type = header[len("data:"):-len(";base64")].lower()
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise ValueError(f"Unsupported image type: {content_type}")
+
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Photo is not valid base64")
+
+    if len(data) > MAX_PHOTO_BYTES:
+        raise ValueError("Image file too large (max 10MB)")
+
+    return content_type, data
+
+def photo_path(digest):
+    """Path stored on a profile for the photo with this content hash"""
+    return f"{PHOTO_PATH}{digest}"
+
+def photo_url(stored):
+    """Absolute URL for a stored photo path; URLs hosted elsewhere pass through"""
+    if isinstance(stored, str) and stored.startswith(PHOTO_PATH):
+        return PHOTO_BASE_URL + stored
+    return stored
+
+async def store_photo(data, content_type):
+    """
+    Store image bytes in GridFS under their SHA-256 digest.
+
+    Identical uploads share one stored file.
+
+    Returns:
+        Hex digest identifying the photo
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    existing = await photos_bucket.find({"filename": digest}).to_list(length=1)
+    if not existing:
+        await photos_bucket.upload_from_stream(
+            digest,
+            data,
+            metadata={"content_type": content_type}
+        )
+    return digest
+
+async def open_photo(digest):
+    """Open a stored photo for streaming, or return None if it does not exist"""
+    files = await photos_bucket.find({"filename": digest}).sort("uploadDate", -1).to_list(length=1)
+    if not files:
+        return None
+    return await photos_bucket.open_download_stream(files[0]["_id"])
+
+async def store_variants(data):
+    """
+    Render the thumbnail variants of an image in a worker process and store them.
+
+    Returns:
+        Dict mapping variant name to the path it is served from
+    """
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(_get_executor(), render_variants, data)
+    return {
+        name: photo_path(await store_photo(variant, VARIANT_CONTENT_TYPE))
+        for name, variant in rendered.items()
+    }
+
+async def attach_variants(collection, profile_id, source_url, data, on_attached=None):
+    """
+    Generate variants for a newly set photo and record them on the profile.
+
+    Runs after the response has been sent. The variants are only written if
+    the profile still shows the photo they were made from.
+    """
+    try:
+        variants = await store_variants(data)
+        updated = await collection.find_one_and_update(
+            {"_id": profile_id, "photo_url": source_url},
+            {"$set": {"photo_variants": variants}, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is not None and on_attached is not None:
+            on_attached(updated)
+    except Exception as e:
+        print(f"Failed to generate photo variants for {profile_id}: {e}")
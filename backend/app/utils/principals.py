@@ -0,0 +1,70 @@
+import os
+import time
+from collections import OrderedDict
+
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+
+# The only profile fields request handlers read from the current user
+PRINCIPAL_PROJECTION = {
+    "email": 1,
+    "name": 1,
+    "is_northeastern_verified": 1,
+}
+
+class PrincipalCache:
+    """
+    Bounded TTL + LRU cache of authenticated principals keyed by token subject.
+
+    Holds at most `max_size` entries, each for at most `ttl` seconds. Entries
+    are small dicts of PRINCIPAL_PROJECTION fields, so the footprint stays
+    bounded regardless of how large profile documents get.
+    """
+
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()   # subject -> (expires at, principal)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, subject):
+        """Return a copy of the cached principal, or None if absent or expired"""
+        cached = self._entries.get(subject)
+        if cached is None or cached[0] < time.monotonic():
+            if cached is not None:
+                del self._entries[subject]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        return dict(cached[1])
+
+    def put(self, subject, principal):
+        self._entries[subject] = (time.monotonic() + self.ttl, dict(principal))
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, subject):
+        """Drop a principal after the profile behind it changed"""
+        self._entries.pop(subject, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+principal_cache = PrincipalCache(max_size=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
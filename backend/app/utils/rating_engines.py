@@ -0,0 +1,281 @@
+import math
+import os
+import numpy as np
+
+# Values assumed for rating fields a profile does not have yet
+FIELD_DEFAULTS = {
+    "elo_rating": 1500,
+    "rating_deviation": 350.0,
+    "rating_volatility": 0.06,
+}
+
+# Conversion between the displayed rating scale and the Glicko-2 scale
+GLICKO2_SCALE = 173.7178
+
+class RatingEngine:
+    """
+    Interface every rating engine implements.
+
+    A player's state is a dict holding the profile fields listed in
+    `fields`. `rate` is the synchronous per-vote path; `rate_period`
+    updates many players at once for a rating period, with every game in
+    the period rated against the opponents' pre-period state.
+
+    `additive` engines produce changes that can be applied as server-side
+    increments on top of whatever the profile holds by then. The others
+    depend on the state they were computed from (Glicko-2 shrinks the
+    deviation in proportion to its current value), so their results must
+    be written as absolute values against an unchanged profile.
+    """
+
+    name = None
+    fields = ()
+    additive = False
+
+    def initial_state(self):
+        return {field: FIELD_DEFAULTS[field] for field in self.fields}
+
+    def state_from_profile(self, profile):
+        """Read this engine's fields from a profile, filling in defaults"""
+        state = {}
+        for field in self.fields:
+            value = profile.get(field)
+            state[field] = FIELD_DEFAULTS[field] if value is None else value
+        return state
+
+    def changes(self, old_state, new_state):
+        """Per-field deltas between two states, for server-side increments"""
+        return {field: new_state[field] - old_state[field] for field in self.fields}
+
+    def rate(self, player, opponent, result):
+        """
+        Rate a single match.
+
+        Args:
+            player: State of the player
+            opponent: State of the opponent
+            result: 1 for win, 0 for loss, 0.5 for draw (from the player's side)
+
+        Returns:
+            Tuple of (new player state, new opponent state)
+        """
+        raise NotImplementedError
+
+    def rate_period(self, state, players_a, players_b, results):
+        """
+        Rate every match of one rating period in a single vectorized pass.
+
+        Args:
+            state: Dict mapping each field to a numpy array indexed by player
+            players_a: Player indices of the first side of each match
+            players_b: Player indices of the second side of each match
+            results: Results from the first side's point of view
+
+        Returns:
+            New state dict of numpy arrays
+        """
+        raise NotImplementedError
+
+class EloEngine(RatingEngine):
+    """Fixed-K ELO, matching calculate_elo"""
+
+    name = "elo"
+    fields = ("elo_rating",)
+    additive = True
+
+    def __init__(self, k_factor=32):
+        self.k_factor = k_factor
+
+    def rate(self, player, opponent, result):
+        # calculate_elo inlined for both sides; this runs on every vote
+        player_rating = player["elo_rating"]
+        opponent_rating = opponent["elo_rating"]
+        k_factor = self.k_factor
+        player_expected = 1 / (1 + 10 ** ((opponent_rating - player_rating) / 400))
+        opponent_expected = 1 / (1 + 10 ** ((player_rating - opponent_rating) / 400))
+        return (
+            {"elo_rating": round(player_rating + k_factor * (result - player_expected))},
+            {"elo_rating": round(opponent_rating + k_factor * ((1 - result) - opponent_expected))},
+        )
+
+    def rate_period(self, state, players_a, players_b, results):
+        ratings = np.asarray(state["elo_rating"], dtype=np.float64)
+        a = np.asarray(players_a, dtype=np.int64)
+        b = np.asarray(players_b, dtype=np.int64)
+        results = np.asarray(results, dtype=np.float64)
+
+        expected_a = 1 / (1 + 10 ** ((ratings[b] - ratings[a]) / 400))
+        deltas = np.zeros_like(ratings)
+        np.add.at(deltas, a, self.k_factor * (results - expected_a))
+        np.add.at(deltas, b, self.k_factor * ((1 - results) - (1 - expected_a)))
+
+        return {"elo_rating": np.round(ratings + deltas)}
+
+class Glicko2Engine(RatingEngine):
+    """
+    Glicko-2 with rating, deviation and volatility.
+
+    On the per-vote path each vote is its own rating period, which is the
+    usual way to run Glicko-2 online. `elo_rating` keeps holding the
+    displayed rating so the leaderboard and matchmaking work unchanged.
+    """
+
+    name = "glicko2"
+    fields = ("elo_rating", "rating_deviation", "rating_volatility")
+
+    def __init__(self, tau=0.5, epsilon=1e-6, max_iterations=100):
+        self.tau = tau
+        self.epsilon = epsilon
+        self.max_iterations = max_iterations
+
+    @staticmethod
+    def _g(phi):
+        return 1 / math.sqrt(1 + 3 * phi ** 2 / math.pi ** 2)
+
+    def _volatility(self, phi, sigma, delta, v):
+        # Illinois algorithm from step 5 of Glickman's Glicko-2 paper
+        a = math.log(sigma ** 2)
+        tau = self.tau
+
+        def f(x):
+            ex = math.exp(x)
+            return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+        big_a = a
+        if delta ** 2 > phi ** 2 + v:
+            big_b = math.log(delta ** 2 - phi ** 2 - v)
+        else:
+            k = 1
+            while f(a - k * tau) < 0:
+                k += 1
+            big_b = a - k * tau
+
+        f_a, f_b = f(big_a), f(big_b)
+        for _ in range(self.max_iterations):
+            if abs(big_b - big_a) <= self.epsilon:
+                break
+            big_c = big_a + (big_a - big_b) * f_a / (f_b - f_a)
+            f_c = f(big_c)
+            if f_c * f_b <= 0:
+                big_a, f_a = big_b, f_b
+            else:
+                f_a /= 2
+            big_b, f_b = big_c, f_c
+
+        return math.exp(big_a / 2)
+
+    def _update(self, state, opponent, score):
+        mu = (state["elo_rating"] - 1500) / GLICKO2_SCALE
+        phi = state["rating_deviation"] / GLICKO2_SCALE
+        sigma = state["rating_volatility"]
+        mu_j = (opponent["elo_rating"] - 1500) / GLICKO2_SCALE
+        phi_j = opponent["rating_deviation"] / GLICKO2_SCALE
+
+        g = self._g(phi_j)
+        expected = 1 / (1 + math.exp(-g * (mu - mu_j)))
+        v = 1 / (g ** 2 * expected * (1 - expected))
+        delta = v * g * (score - expected)
+
+        new_sigma = self._volatility(phi, sigma, delta, v)
+        phi_star = math.sqrt(phi ** 2 + new_sigma ** 2)
+        new_phi = 1 / math.sqrt(1 / phi_star ** 2 + 1 / v)
+        new_mu = mu + new_phi ** 2 * g * (score - expected)
+
+        return {
+            "elo_rating": round(new_mu * GLICKO2_SCALE + 1500),
+            "rating_deviation": new_phi * GLICKO2_SCALE,
+            "rating_volatility": new_sigma,
+        }
+
+    def rate(self, player, opponent, result):
+        return self._update(player, opponent, result), self._update(opponent, player, 1 - result)
+
+    def rate_period(self, state, players_a, players_b, results):
+        mu = (np.asarray(state["elo_rating"], dtype=np.float64) - 1500) / GLICKO2_SCALE
+        phi = np.asarray(state["rating_deviation"], dtype=np.float64) / GLICKO2_SCALE
+        sigma = np.asarray(state["rating_volatility"], dtype=np.float64)
+        a = np.asarray(players_a, dtype=np.int64)
+        b = np.asarray(players_b, dtype=np.int64)
+        results = np.asarray(results, dtype=np.float64)
+
+        # Every match is a game for both sides
+        player = np.concatenate([a, b])
+        opponent = np.concatenate([b, a])
+        score = np.concatenate([results, 1 - results])
+
+        g = 1 / np.sqrt(1 + 3 * phi[opponent] ** 2 / np.pi ** 2)
+        expected = 1 / (1 + np.exp(-g * (mu[player] - mu[opponent])))
+
+        information = np.zeros_like(mu)
+        improvement = np.zeros_like(mu)
+        np.add.at(information, player, g ** 2 * expected * (1 - expected))
+        np.add.at(improvement, player, g * (score - expected))
+
+        played = information > 0
+        v = np.full_like(mu, np.inf)
+        v[played] = 1 / information[played]
+        delta = np.zeros_like(mu)
+        delta[played] = v[played] * improvement[played]
+
+        new_sigma = sigma.copy()
+        new_sigma[played] = self._volatility_vectorized(phi[played], sigma[played], delta[played], v[played])
+
+        # Players who sat the period out only grow more uncertain
+        phi_star = np.sqrt(phi ** 2 + new_sigma ** 2)
+        new_phi = phi_star.copy()
+        new_phi[played] = 1 / np.sqrt(1 / phi_star[played] ** 2 + 1 / v[played])
+        new_mu = mu + np.where(played, new_phi ** 2 * improvement, 0.0)
+
+        return {
+            "elo_rating": np.round(new_mu * GLICKO2_SCALE + 1500),
+            "rating_deviation": new_phi * GLICKO2_SCALE,
+            "rating_volatility": new_sigma,
+        }
+
+    def _volatility_vectorized(self, phi, sigma, delta, v):
+        # The Illinois iteration of _volatility, run for every player at once
+        a = np.log(sigma ** 2)
+        tau = self.tau
+
+        def f(x):
+            ex = np.exp(x)
+            return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+        big_a = a.copy()
+        wide = delta ** 2 > phi ** 2 + v
+        big_b = np.where(wide, np.log(np.where(wide, delta ** 2 - phi ** 2 - v, 1.0)), a - tau)
+        searching = ~wide & (f(big_b) < 0)
+        k = 1
+        while searching.any():
+            k += 1
+            big_b = np.where(searching, a - k * tau, big_b)
+            searching &= f(big_b) < 0
+
+        f_a, f_b = f(big_a), f(big_b)
+        for _ in range(self.max_iterations):
+            active = np.abs(big_b - big_a) > self.epsilon
+            if not active.any():
+                break
+            big_c = big_a + (big_a - big_b) * f_a / np.where(active, f_b - f_a, 1.0)
+            f_c = f(big_c)
+            swap = f_c * f_b <= 0
+            big_a = np.where(active & swap, big_b, big_a)
+            f_a = np.where(active, np.where(swap, f_b, f_a / 2), f_a)
+            big_b = np.where(active, big_c, big_b)
+            f_b = np.where(active, f_c, f_b)
+
+        return np.exp(big_a / 2)
+
+ENGINES = {
+    EloEngine.name: EloEngine,
+    Glicko2Engine.name: Glicko2Engine,
+}
+
+def get_rating_engine(name=None):
+    """Instantiate the engine named by `name` or the RATING_ENGINE setting"""
+    name = (name or os.environ.get("RATING_ENGINE", "elo")).lower()
+    if name not in ENGINES:
+        raise ValueError(f"Unknown rating engine: {name} (expected one of {', '.join(ENGINES)})")
+    return ENGINES[name]()
+
+rating_engine = get_rating_engine()
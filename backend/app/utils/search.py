@@ -0,0 +1,59 @@
+import os
+import re
+
+# Shortest search term accepted; shorter prefixes match too much of the index
+SEARCH_MIN_TERM_LENGTH = int(os.environ.get("SEARCH_MIN_TERM_LENGTH", "2"))
+SEARCH_MAX_TERMS = int(os.environ.get("SEARCH_MAX_TERMS", "5"))
+
+_WORD = re.compile(r"\w+")
+
+def tokenize(text):
+    """Lowercased words of `text`"""
+    if not isinstance(text, str):
+        return []
+    return _WORD.findall(text.lower())
+
+def search_terms(profile):
+    """
+    Words a profile can be found by: its name and the companies it lists.
+
+    Stored sorted and deduplicated in `search_terms`, a multikey field
+    indexed together with the ranking order.
+    """
+    terms = set(tokenize(profile.get("name")))
+    for experience in profile.get("experiences") or []:
+        if isinstance(experience, dict):
+            terms.update(tokenize(experience.get("company")))
+    return sorted(terms)
+
+def search_filter(q=None, club=None, major=None, year=None):
+    """
+    Build the MongoDB filter for a profile search.
+
+    Every word of `q` must prefix-match one of a profile's search terms.
+    Prefixes are anchored, so each one is an index range scan rather than a
+    regex over every document.
+
+    Raises:
+        ValueError: If `q` has too many words or a word that is too short
+    """
+    conditions = []
+
+    words = tokenize(q)
+    if len(words) > SEARCH_MAX_TERMS:
+        raise ValueError(f"Search is limited to {SEARCH_MAX_TERMS} words")
+    if any(len(word) < SEARCH_MIN_TERM_LENGTH for word in words):
+        raise ValueError(f"Search words need at least {SEARCH_MIN_TERM_LENGTH} characters")
+    for word in words:
+        conditions.append({"search_terms": re.compile("^" + re.escape(word))})
+
+    if club:
+        conditions.append({"clubs.id": club})
+    if major:
+        conditions.append({"education.major": major})
+    if year is not None:
+        conditions.append({"education.graduation_year": year})
+
+    if not conditions:
+        return {}
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
@@ -0,0 +1,94 @@
+from datetime import datetime
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from ..models.profile import (
+    PROFILE_PROJECTION, PROFILE_DEFAULTS, EDUCATION_DEFAULTS, LEADERBOARD_PROJECTION, LeaderboardEntry
+)
+from .photos import photo_url
+
+def _default(value):
+    # Called by orjson only for types it does not handle natively
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson, which also understands ObjectId"""
+
+    def render(self, content):
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+def merge_defaults(document, projection, defaults):
+    """
+    Build a response dict from a MongoDB document in a single pass.
+
+    Takes every projected field, substitutes defaults for missing or null
+    values and turns `_id` into a string. Fields outside the projection are
+    dropped, so the result is what the response model would keep anyway.
+    """
+    result = {}
+    for field in projection:
+        value = document.get(field)
+        if value is None and field in defaults:
+            default = defaults[field]
+            value = default() if callable(default) else default
+        result[field] = value
+
+    education = result.get("education")
+    if isinstance(education, dict) and not EDUCATION_DEFAULTS.keys() <= education.keys():
+        result["education"] = {**EDUCATION_DEFAULTS, **education}
+
+    if "_id" in document:
+        result["_id"] = str(document["_id"])
+    return link_photos(result)
+
+def link_photos(result):
+    """Turn the stored photo paths of a response dict into absolute URLs"""
+    if "photo_url" in result:
+        result["photo_url"] = photo_url(result["photo_url"])
+    variants = result.get("photo_variants")
+    if variants:
+        result["photo_variants"] = {name: photo_url(path) for name, path in variants.items()}
+    return result
+
+def leaderboard_entry(document):
+    """Shape a (possibly unprojected) profile document for a LeaderboardEntry response"""
+    entry = LeaderboardEntry(**{field: document[field] for field in LEADERBOARD_PROJECTION if field in document}).dict()
+    entry["_id"] = str(document["_id"])
+    return link_photos(entry)
+
+def profile_response(document):
+    """Shape a profile document for a Profile response"""
+    return merge_defaults(document, PROFILE_PROJECTION, PROFILE_DEFAULTS)
+
+def parse_fields(fields, projection, always=()):
+    """
+    Turn a `fields=` query value into a MongoDB projection.
+
+    Args:
+        fields: Comma separated field names, or None/empty for everything
+        projection: Projection of every field the endpoint can return
+        always: Fields included whether requested or not
+
+    Returns:
+        Projection dict, or None when no sparse fieldset was requested
+
+    Raises:
+        ValueError: If a requested field is not one the endpoint returns
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in projection]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {field: 1 for field in (*always, *requested)}
+
+def select_fields(entry, projection):
+    """Cut an already-built response dict down to a sparse fieldset, keeping _id"""
+    selected = {field: entry[field] for field in projection if field in entry}
+    selected["_id"] = entry["_id"]
+    return selected
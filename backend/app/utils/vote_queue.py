@@ -0,0 +1,313 @@
+import asyncio
+import fcntl
+import glob
+import json
+import os
+from datetime import datetime
+from bson import ObjectId
+from .rating_engines import rating_engine
+from .votes import load_ratings, rating_increment, match_record
+from .leaderboard import leaderboard_cache
+from .http_cache import profile_response_cache
+
+VOTE_WRITE_BEHIND = os.environ.get("VOTE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+VOTE_QUEUE_MAX_SIZE = int(os.environ.get("VOTE_QUEUE_MAX_SIZE", "10000"))
+VOTE_BATCH_SIZE = int(os.environ.get("VOTE_BATCH_SIZE", "500"))
+VOTE_FLUSH_INTERVAL_SECONDS = float(os.environ.get("VOTE_FLUSH_INTERVAL_SECONDS", "0.05"))
+VOTE_SPOOL_DIR = os.environ.get("VOTE_SPOOL_DIR", "vote_spool")
+VOTE_SPOOL_FSYNC = os.environ.get("VOTE_SPOOL_FSYNC", "false").lower() in ("1", "true", "yes")
+
+class VoteQueue:
+    """
+    Write-behind queue that applies votes to MongoDB in batches.
+
+    Accepted votes are appended to a per-process spool file before they are
+    acknowledged, then applied by a background task: each batch loads the
+    ratings it needs in one query, replays the votes in order with the
+    configured rating engine, and writes the summed changes with one bulk_write. The
+    last applied sequence number is checkpointed next to the spool, so votes
+    left behind by a crash are replayed on the next start. Delivery is
+    at-least-once: a crash between a flush and its checkpoint replays that
+    batch.
+    """
+
+    def __init__(self, max_size=10000, batch_size=500, flush_interval=0.05,
+                 spool_dir="vote_spool", fsync=False):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.fsync = fsync
+        self.accepted = 0
+        self.applied = 0
+        self.rejected = 0
+        self.batches = 0
+        self._collection = None
+        self._matches_collection = None
+        self._queue = None
+        self._worker = None
+        self._spool = None
+        self._spool_path = None
+        self._seq = 0
+        self._applied_seq = 0
+        self._accepting = False
+
+    @property
+    def running(self):
+        return self._accepting
+
+    def __len__(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self, collection, matches_collection):
+        """
+        Open the spool, recover votes left by dead processes, and start flushing.
+
+        Batches are written as server-side increments, so only engines whose
+        changes are additive can be queued; with any other engine the queue
+        stays off and votes are applied synchronously.
+        """
+        if not rating_engine.additive:
+            print(f"Write-behind votes need an additive rating engine; "
+                  f"applying {rating_engine.name} votes synchronously instead")
+            return
+
+        self._collection = collection
+        self._matches_collection = matches_collection
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        self._spool_path = os.path.join(self.spool_dir, f"votes-{os.getpid()}.log")
+        recovered, orphans = self._collect_orphans()
+
+        self._spool = open(self._spool_path, "a")
+        fcntl.flock(self._spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._spool.truncate(0)
+        self._write_checkpoint(0)
+
+        self._worker = asyncio.create_task(self._run())
+        self._accepting = True
+
+        # Re-spool recovered votes under this process before deleting the orphans;
+        # each orphan stays locked until it is gone so no other worker recovers it too
+        for profile_id, opponent_id, result, accepted_at in recovered:
+            await self._queue.put(self._append(profile_id, opponent_id, result, accepted_at))
+        for path, spool in orphans:
+            self._remove_spool(path)
+            spool.close()
+
+        if recovered:
+            print(f"Recovered {len(recovered)} spooled votes from {len(orphans)} spool files")
+
+    def _collect_orphans(self):
+        """
+        Read the votes left in spool files whose owner is gone.
+
+        Live workers hold a lock on their spool, so a file that can be
+        locked is an orphan. The locks are kept: the orphans are returned
+        still open, and must be closed only after they have been removed.
+
+        Returns:
+            Tuple of (recovered votes, list of (path, locked open file))
+        """
+        recovered, orphans = [], []
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "votes-*.log"))):
+            spool = open(path, "r")
+            try:
+                fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                spool.close()
+                continue
+            # Another worker recovered and removed it between our open and lock
+            if os.fstat(spool.fileno()).st_nlink == 0:
+                spool.close()
+                continue
+            checkpoint = self._read_checkpoint(path)
+            for line in spool:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn final write from a crash
+                    continue
+                if entry["seq"] > checkpoint:
+                    recovered.append((entry["profile_id"], entry["opponent_id"], entry["result"], entry.get("at")))
+            if path == self._spool_path:
+                # Left by an earlier process with our pid; reopened below as ours
+                spool.close()
+            else:
+                orphans.append((path, spool))
+        return recovered, orphans
+
+    @staticmethod
+    def _read_checkpoint(spool_path):
+        try:
+            with open(spool_path + ".checkpoint") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_checkpoint(self, seq):
+        tmp_path = self._spool_path + ".checkpoint.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(seq))
+        os.replace(tmp_path, self._spool_path + ".checkpoint")
+
+    @staticmethod
+    def _remove_spool(path):
+        for stale in (path, path + ".checkpoint"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+    def _append(self, profile_id, opponent_id, result, accepted_at=None):
+        self._seq += 1
+        accepted_at = accepted_at or datetime.utcnow().isoformat()
+        self._spool.write(json.dumps({
+            "seq": self._seq,
+            "profile_id": profile_id,
+            "opponent_id": opponent_id,
+            "result": result,
+            "at": accepted_at,
+        }) + "\n")
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+        return (self._seq, profile_id, opponent_id, result, accepted_at)
+
+    def submit(self, profile_id, opponent_id, result):
+        """
+        Accept a vote for later application.
+
+        Returns:
+            False if the queue is full or shutting down, True once the vote is spooled
+        """
+        if not self._accepting or self._queue.full():
+            self.rejected += 1
+            return False
+
+        self._queue.put_nowait(self._append(profile_id, opponent_id, result))
+        self.accepted += 1
+        return True
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            waited = False
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    if waited:
+                        break
+                    await asyncio.sleep(self.flush_interval)
+                    waited = True
+
+            delay = self.flush_interval
+            while True:
+                try:
+                    await self._flush(batch)
+                    break
+                except Exception as e:
+                    # Keep the batch and back off; the queue applies backpressure meanwhile
+                    print(f"Vote batch flush failed, retrying in {delay:.2f}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 5)
+
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _flush(self, batch):
+        profile_oids = set()
+        for _, profile_id, opponent_id, _, _ in batch:
+            profile_oids.add(ObjectId(profile_id))
+            profile_oids.add(ObjectId(opponent_id))
+
+        profiles = await load_ratings(self._collection, profile_oids)
+        initial = {oid: rating_engine.state_from_profile(profile) for oid, profile in profiles.items()}
+        states = dict(initial)
+        matches = {}
+        records = []
+
+        # Replay the votes in order, exactly as individual requests would
+        for _, profile_id, opponent_id, result, accepted_at in batch:
+            profile_oid, opponent_oid = ObjectId(profile_id), ObjectId(opponent_id)
+            if profile_oid not in states or opponent_oid not in states or profile_oid == opponent_oid:
+                continue
+
+            profile_state, opponent_state = states[profile_oid], states[opponent_oid]
+            new_profile_state, new_opponent_state = rating_engine.rate(profile_state, opponent_state, result)
+            states[profile_oid], states[opponent_oid] = new_profile_state, new_opponent_state
+            matches[profile_oid] = matches.get(profile_oid, 0) + 1
+            matches[opponent_oid] = matches.get(opponent_oid, 0) + 1
+
+            records.append(match_record(
+                profile_oid,
+                opponent_oid,
+                result,
+                [profile_state["elo_rating"], opponent_state["elo_rating"]],
+                [new_profile_state["elo_rating"], new_opponent_state["elo_rating"]],
+                datetime.fromisoformat(accepted_at)
+            ))
+
+        if matches:
+            await asyncio.gather(
+                self._collection.bulk_write(
+                    [
+                        rating_increment(oid, rating_engine.changes(initial[oid], states[oid]), matches[oid])
+                        for oid in matches
+                    ],
+                    ordered=False
+                ),
+                self._matches_collection.insert_many(records, ordered=False)
+            )
+
+        profile_response_cache.invalidate(*(str(oid) for oid in matches))
+        # Shift by what this batch changed; other writers may have moved the ratings since they were read
+        for oid in matches:
+            rating_delta = states[oid]["elo_rating"] - initial[oid]["elo_rating"]
+            leaderboard_cache.shift_rating(str(oid), rating_delta, matches[oid])
+
+        self._applied_seq = batch[-1][0]
+        self._write_checkpoint(self._applied_seq)
+        self.applied += len(batch)
+        self.batches += 1
+
+        # Everything spooled so far is in MongoDB; start the spool over
+        if self._applied_seq == self._seq:
+            self._spool.truncate(0)
+
+    async def drain(self, timeout=30):
+        """Stop accepting votes and flush whatever is queued"""
+        if self._worker is None:
+            return
+
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Vote queue drain timed out with {self._queue.qsize()} votes left in the spool")
+
+        self._worker.cancel()
+        self._worker = None
+        self._spool.close()
+        if self._applied_seq == self._seq:
+            self._remove_spool(self._spool_path)
+
+    def stats(self):
+        return {
+            "enabled": self._accepting,
+            "queued": len(self),
+            "accepted": self.accepted,
+            "applied": self.applied,
+            "rejected": self.rejected,
+            "batches": self.batches,
+        }
+
+vote_queue = VoteQueue(
+    max_size=VOTE_QUEUE_MAX_SIZE,
+    batch_size=VOTE_BATCH_SIZE,
+    flush_interval=VOTE_FLUSH_INTERVAL_SECONDS,
+    spool_dir=VOTE_SPOOL_DIR,
+    fsync=VOTE_SPOOL_FSYNC,
+)
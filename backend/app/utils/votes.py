@@ -0,0 +1,226 @@
+import asyncio
+import os
+import weakref
+from datetime import datetime
+from pymongo import UpdateOne
+
+from .rating_engines import FIELD_DEFAULTS, rating_engine
+
+# Only the fields a rating update reads; version guards compare-and-set writes
+RATING_PROJECTION = {"elo_rating": 1, "match_count": 1, "rating_deviation": 1, "rating_volatility": 1, "version": 1}
+
+# Attempts at a compare-and-set rating write before giving up on a busy profile
+VOTE_CONFLICT_RETRIES = int(os.environ.get("VOTE_CONFLICT_RETRIES", "5"))
+
+class RatingConflict(Exception):
+    """Raised when a profile kept changing under a compare-and-set rating write"""
+
+# Per-profile locks serializing non-additive votes within this process;
+# a lock lives only while some vote holds it
+_profile_locks = weakref.WeakValueDictionary()
+
+def rating_increment(profile_oid, changes, matches=1):
+    """
+    Build an update that shifts a profile's rating fields by `changes`.
+
+    New values are computed server-side from whatever the document holds
+    when the update runs, so concurrent votes on the same profile all land
+    instead of overwriting each other with a stale $set. Only valid for
+    engines whose changes are additive; see rating_compare_and_set.
+
+    Args:
+        profile_oid: ObjectId of the profile to update
+        changes: Dict mapping rating fields to the delta to apply
+        matches: Number of matches to add to match_count
+
+    Returns:
+        pymongo UpdateOne for use with bulk_write
+    """
+    fields = {
+        field: {"$add": [{"$ifNull": [f"${field}", FIELD_DEFAULTS[field]]}, delta]}
+        for field, delta in changes.items()
+    }
+    fields["match_count"] = {"$add": [{"$ifNull": ["$match_count", 0]}, matches]}
+    # Any change to the profile invalidates its cached responses
+    fields["version"] = {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+    return UpdateOne({"_id": profile_oid}, [{"$set": fields}])
+
+def rating_compare_and_set(profile, new_state, matches=1):
+    """
+    Build an update writing absolute rating fields to an unchanged profile.
+
+    Used for engines whose changes are not additive. The filter matches
+    only while the profile still has the version it was read with (a
+    missing version matches None), so a concurrent vote or edit makes the
+    write miss instead of overwriting it.
+
+    Args:
+        profile: Profile document as read, with its _id and version
+        new_state: Rating fields to write
+        matches: Number of matches to add to match_count
+
+    Returns:
+        Tuple of (filter, update) for update_one
+    """
+    return (
+        {"_id": profile["_id"], "version": profile.get("version")},
+        {"$set": dict(new_state), "$inc": {"match_count": matches, "version": 1}},
+    )
+
+def rating_rollback(profile, matches=1):
+    """
+    Build an update undoing a compare-and-set write made from `profile`.
+
+    Matches only while the profile still holds that write (its version one
+    past the one it was read with), so a write anything else has built on
+    since is left alone.
+
+    Returns:
+        Tuple of (filter, update) for update_one
+    """
+    state = rating_engine.state_from_profile(profile)
+    return (
+        {"_id": profile["_id"], "version": (profile.get("version") or 0) + 1},
+        {"$set": state, "$inc": {"match_count": -matches, "version": 1}},
+    )
+
+async def _finish_side(collection, profile, opponent_state, score):
+    # The other side of this vote is already written and cannot be undone,
+    # so this side is retried until it lands: on a miss, re-read the
+    # profile and rate it again against the same opponent state
+    while True:
+        state = rating_engine.state_from_profile(profile)
+        new_state, _ = rating_engine.rate(state, opponent_state, score)
+        result = await collection.update_one(*rating_compare_and_set(profile, new_state))
+        if result.matched_count:
+            return state, new_state
+        profile = await collection.find_one({"_id": profile["_id"]}, RATING_PROJECTION)
+        if profile is None:
+            # Nothing left to rate; the written side stands on its own
+            return state, state
+
+async def _rate_pair(collection, profile_oid, opponent_oid, result):
+    # Both sides of one vote under compare-and-set. Nothing is kept unless
+    # both writes land: the first is undone when the second misses, and
+    # the pair is re-read and rated again.
+    for _ in range(VOTE_CONFLICT_RETRIES):
+        current = await load_ratings(collection, [profile_oid, opponent_oid])
+        if profile_oid not in current or opponent_oid not in current:
+            raise RatingConflict("Profile was deleted while its vote was applied")
+        profile, opponent = current[profile_oid], current[opponent_oid]
+        profile_state = rating_engine.state_from_profile(profile)
+        opponent_state = rating_engine.state_from_profile(opponent)
+        new_profile_state, new_opponent_state = rating_engine.rate(profile_state, opponent_state, result)
+
+        written = await collection.update_one(*rating_compare_and_set(profile, new_profile_state))
+        if not written.matched_count:
+            continue
+        written = await collection.update_one(*rating_compare_and_set(opponent, new_opponent_state))
+        if written.matched_count:
+            return (profile_state, new_profile_state), (opponent_state, new_opponent_state)
+
+        undone = await collection.update_one(*rating_rollback(profile))
+        if not undone.matched_count:
+            # Another vote already built on the first write; keep it and
+            # complete the vote on the opponent instead
+            opponent_sides = await _finish_side(collection, opponent, profile_state, 1 - result)
+            return (profile_state, new_profile_state), opponent_sides
+    raise RatingConflict("Profile is being updated too often, try again")
+
+async def apply_vote(collection, profile, opponent, result, matches_collection=None):
+    """
+    Rate one vote with the configured engine and write both profiles.
+
+    Additive engines (ELO) write both changes as server-side increments in
+    one bulk_write, so concurrent votes all land. Other engines apply votes
+    on a profile one after another: under per-profile locks the pair is
+    re-read, rated, and each side's absolute state written with a
+    compare-and-set on its version. If the second write misses, the first
+    is undone and the pair is rated again, so a RatingConflict leaves both
+    profiles as they were.
+
+    Args:
+        collection: Profiles collection
+        profile: Profile document with RATING_PROJECTION fields
+        opponent: Opponent document with RATING_PROJECTION fields
+        result: 1 if the profile won, 0 if it lost, 0.5 for a draw
+        matches_collection: If given, the match is logged there too;
+            alongside the increments, or once the compare-and-set writes landed
+
+    Returns:
+        Tuple of ((profile state before, after), (opponent state before, after))
+
+    Raises:
+        RatingConflict: If a compare-and-set write kept missing; neither
+            profile was changed
+    """
+    profile_state = rating_engine.state_from_profile(profile)
+    opponent_state = rating_engine.state_from_profile(opponent)
+
+    def log(sides):
+        (before, after), (opponent_before, opponent_after) = sides
+        return matches_collection.insert_one(match_record(
+            profile["_id"],
+            opponent["_id"],
+            result,
+            [before["elo_rating"], opponent_before["elo_rating"]],
+            [after["elo_rating"], opponent_after["elo_rating"]]
+        ))
+
+    if rating_engine.additive:
+        new_profile_state, new_opponent_state = rating_engine.rate(profile_state, opponent_state, result)
+        sides = (profile_state, new_profile_state), (opponent_state, new_opponent_state)
+        writes = [collection.bulk_write([
+            rating_increment(profile["_id"], rating_engine.changes(profile_state, new_profile_state)),
+            rating_increment(opponent["_id"], rating_engine.changes(opponent_state, new_opponent_state)),
+        ], ordered=False)]
+        if matches_collection is not None:
+            writes.append(log(sides))
+        await asyncio.gather(*writes)
+        return sides
+
+    # Votes on the same profile take turns in this process, each rating the
+    # state the previous one wrote; the version check catches other workers
+    locks = [_profile_locks.setdefault(oid, asyncio.Lock()) for oid in sorted({profile["_id"], opponent["_id"]})]
+    for lock in locks:
+        await lock.acquire()
+    try:
+        sides = await _rate_pair(collection, profile["_id"], opponent["_id"], result)
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+    if matches_collection is not None:
+        await log(sides)
+    return sides
+
+async def load_ratings(collection, profile_oids):
+    """Fetch ratings and match counts for several profiles in one round trip"""
+    profiles = await collection.find(
+        {"_id": {"$in": list(profile_oids)}},
+        RATING_PROJECTION
+    ).to_list(length=None)
+    return {profile["_id"]: profile for profile in profiles}
+
+def match_record(profile_oid, opponent_oid, result, ratings_before, ratings_after, played_at=None):
+    """
+    Build a match log entry.
+
+    Args:
+        profile_oid: ObjectId of the profile that was voted on
+        opponent_oid: ObjectId of its opponent
+        result: 1 if the profile won, 0 if it lost, 0.5 for a draw
+        ratings_before: [profile rating, opponent rating] before the vote
+        ratings_after: [profile rating, opponent rating] after the vote
+        played_at: When the vote was cast (defaults to now)
+
+    Returns:
+        Document for the append-only matches collection
+    """
+    return {
+        "profile_id": profile_oid,
+        "opponent_id": opponent_oid,
+        "result": result,
+        "played_at": played_at or datetime.utcnow(),
+        "ratings_before": list(ratings_before),
+        "ratings_after": list(ratings_after),
+    }